@@ -0,0 +1,43 @@
+"""Add pending dispatch index
+
+Revision ID: e2b7a4d91c05
+Revises: 4c1f0d2e7b9a
+Create Date: 2026-10-16 14:03:27.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b7a4d91c05"
+down_revision: Union[str, None] = "4c1f0d2e7b9a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+pending = sa.text("completed IS NULL AND failed IS NULL")
+
+
+def upgrade() -> None:
+    # Built concurrently on Postgres so that the jobs table stays writable meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_jobs_pending_dispatch",
+            "jobs",
+            [sa.text("priority DESC"), sa.text("retry DESC"), "id"],
+            unique=False,
+            postgresql_where=pending,
+            postgresql_concurrently=True,
+            sqlite_where=pending,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_jobs_pending_dispatch",
+            table_name="jobs",
+            postgresql_concurrently=True,
+        )
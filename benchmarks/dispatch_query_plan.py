@@ -0,0 +1,128 @@
+"""Check that the dispatch query only reads pending jobs, and time it.
+
+Point DATABASE_URL at a scratch database: the tables are created, filled with
+``--completed`` finished jobs and ``--pending`` queued jobs spread over ``--hosts``
+hosts, and dropped again afterwards. Exits with status 1 if the query plan scans
+the whole jobs table.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.dispatch_query_plan
+"""
+
+import argparse
+import asyncio
+import datetime
+from itertools import batched
+from os import environ
+import random
+import re
+import time
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+from sqlalchemy import insert
+
+from src.main import claimable_jobs_query
+from src.models import URL, Base, Job
+
+# Reading the pending jobs through an index (SQLite: "SCAN jobs USING INDEX ...") is
+# fine, only a scan of the table itself reads every job
+full_scans = {"postgresql": r"Seq Scan on jobs\b", "sqlite": r"SCAN jobs\b(?! USING)"}
+
+
+async def seed(
+    conn: sqlalchemy.ext.asyncio.AsyncConnection,
+    completed: int,
+    pending: int,
+    hosts: int,
+):
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    url_count = max(1, (completed + pending) // 10)
+    for chunk in batched(range(url_count), 10000):
+        await conn.execute(
+            insert(URL),
+            [
+                {
+                    "url": f"https://site{i % hosts}.example.com/{i}",
+                    "hostname": f"site{i % hosts}.example.com",
+                }
+                for i in chunk
+            ],
+        )
+    rows = [
+        {
+            "url_id": random.randint(1, url_count),
+            "completed": now,
+            "priority": 0,
+            "retry": 0,
+        }
+        for _ in range(completed)
+    ] + [
+        {
+            "url_id": random.randint(1, url_count),
+            "completed": None,
+            "priority": random.choice((0, 0, 0, 10)),
+            "retry": random.randint(0, 4),
+        }
+        for _ in range(pending)
+    ]
+    random.shuffle(rows)
+    for chunk in batched(rows, 10000):
+        await conn.execute(insert(Job), list(chunk))
+    await conn.execute(sqlalchemy.text("ANALYZE"))
+
+
+async def main(completed: int, pending: int, hosts: int, runs: int):
+    engine = sqlalchemy.ext.asyncio.create_async_engine(
+        environ.get("DATABASE_URL", "sqlite+aiosqlite:///dispatch_query_plan.sqlite")
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            print(
+                f"Seeding {completed} completed and {pending} pending jobs "
+                f"over {hosts} hosts..."
+            )
+            await seed(conn, completed, pending, hosts)
+        stmt = claimable_jobs_query(
+            datetime.datetime.now(tz=datetime.timezone.utc), 100, per_host=10
+        )
+        async with engine.connect() as conn:
+            full_scan = full_scans[conn.dialect.name]
+            sql = str(
+                stmt.compile(
+                    dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+                )
+            )
+            explain = (
+                "EXPLAIN ANALYZE"
+                if conn.dialect.name == "postgresql"
+                else "EXPLAIN QUERY PLAN"
+            )
+            plan = "\n".join(
+                str(row[-1])
+                for row in await conn.execute(sqlalchemy.text(f"{explain} {sql}"))
+            )
+            print(plan)
+            start = time.perf_counter()
+            for _ in range(runs):
+                (await conn.execute(stmt)).all()
+            elapsed = (time.perf_counter() - start) / runs
+            print(f"Dispatch query: {elapsed * 1000:.3f} ms average over {runs} runs")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+    if re.search(full_scan, plan):
+        print("FAIL: the dispatch query scans every job")
+        raise SystemExit(1)
+    print("OK: the dispatch query only reads pending jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--completed", type=int, default=500000)
+    parser.add_argument("--pending", type=int, default=5000)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.completed, args.pending, args.hosts, args.runs))
@@ -0,0 +1,114 @@
+"""A local stand-in for the Wayback Machine's ``/save/<url>`` endpoint.
+
+Successful saves answer like the real endpoint, with a redirect to
+``/web/<14 digit timestamp>/<url>``. Latency, errors and bursts of 429 responses
+can be configured to see how the workers cope with them. Point the server at the
+workers with ``WAYBACK_SAVE_URL=http://127.0.0.1:8765/save/``.
+
+    python -m benchmarks.fake_wayback --latency-ms 500 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import datetime
+from dataclasses import dataclass
+import random
+import time
+
+from aiohttp import web
+
+
+@dataclass
+class FakeWaybackConfig:
+    # Median response time, and how the response times are spread around it
+    latency_ms: float = 200
+    latency_distribution: str = "lognormal"  # "constant", "uniform" or "lognormal"
+    # Share of requests that fail with a 5xx response for that URL (as for a dead
+    # site), as opposed to the throttling bursts, which fail every request
+    error_rate: float = 0
+    # Every burst_every seconds, every request is throttled for burst_seconds
+    burst_every: float = 0
+    burst_seconds: float = 0
+    retry_after: int = 5
+
+    def latency(self) -> float:
+        median = self.latency_ms / 1000
+        match self.latency_distribution:
+            case "constant":
+                return median
+            case "uniform":
+                return random.uniform(0, 2 * median)
+            case "lognormal":
+                return random.lognormvariate(0, 0.5) * median
+        raise ValueError(f"Unknown latency distribution {self.latency_distribution}")
+
+
+def create_app(config: FakeWaybackConfig) -> web.Application:
+    stats = {"saved": 0, "errors": 0, "throttled": 0}
+    started = time.monotonic()
+
+    async def save(request: web.Request) -> web.Response:
+        if config.burst_every and (
+            (time.monotonic() - started) % config.burst_every < config.burst_seconds
+        ):
+            stats["throttled"] += 1
+            return web.Response(
+                status=429, headers={"Retry-After": str(config.retry_after)}
+            )
+        await asyncio.sleep(config.latency())
+        if random.random() < config.error_rate:
+            stats["errors"] += 1
+            return web.Response(status=random.choice((500, 502, 520, 523)))
+        stats["saved"] += 1
+        timestamp = datetime.datetime.now(tz=datetime.timezone.utc).strftime(
+            "%Y%m%d%H%M%S"
+        )
+        return web.Response(
+            status=302,
+            headers={"Location": f"/web/{timestamp}/{request.match_info['url']}"},
+        )
+
+    async def print_stats(_: web.Application):
+        print(
+            "Fake Wayback responses: " + ", ".join(f"{k}={v}" for k, v in stats.items())
+        )
+
+    app = web.Application()
+    app.router.add_get("/save/{url:.*}", save)
+    app.on_cleanup.append(print_stats)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Add the FakeWaybackConfig options, shared with benchmarks.worker_throughput."""
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("constant", "uniform", "lognormal"),
+        default="lognormal",
+    )
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--burst-every", type=float, default=0)
+    parser.add_argument("--burst-seconds", type=float, default=0)
+    parser.add_argument("--retry-after", type=int, default=5)
+
+
+def config_from_arguments(args: argparse.Namespace) -> FakeWaybackConfig:
+    return FakeWaybackConfig(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+        retry_after=args.retry_after,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(config_from_arguments(args)), host="127.0.0.1", port=args.port
+    )
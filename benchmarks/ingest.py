@@ -0,0 +1,119 @@
+"""Compare how fast batches of URLs are queued with the ORM and with Core upserts.
+
+For every ``--sizes`` batch size, each implementation queues a batch of new URLs into
+empty tables and then a second batch of the same URLs, which all exist by then. The
+ORM implementation is the one ``add_batch`` used before src/ingest.py: it looks up
+the existing URLs, adds the missing ones, looks all of them up again for their IDs,
+and adds ``Job`` objects whose ``batches`` relationship inserts the association rows.
+
+Point DATABASE_URL at a scratch database: the tables are dropped and created before
+each run, and dropped again at the end.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.ingest --sizes 100000 1000000
+"""
+
+import argparse
+import asyncio
+from itertools import batched
+from os import environ
+import time
+from typing import Awaitable, Callable, Iterable
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+from sqlalchemy import select
+
+
+async def orm_add_batch(urls: Iterable[str], *, priority: int = 0) -> int:
+    from src.main import async_session
+    from src.models import URL, Batch, Job
+
+    job_count = 0
+    async with async_session() as session, session.begin():
+        batch = Batch()
+        for urls_set in batched(urls, 30000):
+            stmt = select(URL).where(URL.url.in_(urls_set))
+            result = await session.scalars(stmt)
+            existing_urls = {url.url for url in result.all()}
+            new_urls = set(urls_set) - existing_urls
+            if new_urls:
+                session.add_all([URL(url=url) for url in new_urls])
+            stmt = select(URL).where(URL.url.in_(urls_set))
+            result = await session.scalars(stmt)
+            url_map = {url.url: url for url in result.all()}
+            session.add_all(
+                [
+                    Job(url=url_map[url], batches=[batch], priority=priority)
+                    for url in urls_set
+                ]
+            )
+            job_count += len(urls_set)
+    return job_count
+
+
+async def core_add_batch(urls: Iterable[str], *, priority: int = 0) -> int:
+    from src.routes.queue.batch import add_batch
+
+    return (await add_batch(urls, priority=priority, tags=[])).job_count
+
+
+implementations: dict[str, Callable[..., Awaitable[int]]] = {
+    "orm": orm_add_batch,
+    "core": core_add_batch,
+}
+
+
+async def reset_database(engine: sqlalchemy.ext.asyncio.AsyncEngine):
+    from src.models import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def main(args: argparse.Namespace):
+    # Only the ingestion code is measured, the app is not started
+    environ["SENTRY_DSN"] = ""
+    from src import main as app_main
+    from src.models import Base
+    from src.routes import load_routes
+
+    app_main.engine = sqlalchemy.ext.asyncio.create_async_engine(
+        environ["DATABASE_URL"]
+    )
+    app_main.async_session = sqlalchemy.ext.asyncio.async_sessionmaker(
+        app_main.engine, expire_on_commit=False
+    )
+    load_routes()
+    try:
+        for size in args.sizes:
+            urls = [f"https://site{i % 1000}.example.com/{i}" for i in range(size)]
+            print(f"{size} URLs:")
+            for name in args.implementations:
+                await reset_database(app_main.engine)
+                for label in ("new", "existing"):
+                    start = time.perf_counter()
+                    job_count = await implementations[name](urls)
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f"  {name:<5} {label:<9} {elapsed:8.2f} s"
+                        f"  ({job_count / elapsed:9.0f} URLs/s)"
+                    )
+    finally:
+        async with app_main.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await app_main.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument(
+        "--implementations",
+        nargs="+",
+        choices=implementations,
+        default=list(implementations),
+    )
+    args = parser.parse_args()
+    environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///ingest.sqlite")
+    asyncio.run(main(args))
@@ -0,0 +1,245 @@
+"""Measure what Sentry tracing and profiling add to the latency of each request.
+
+Runs the same requests against the app with Sentry off, with the old settings (every
+transaction traced and profiled), with the sampler and its configuration from the
+environment (see src/tracing.py), and with tracing turned off (errors only). Events
+go to a transport that only counts them, nothing is sent anywhere.
+
+Sentry patches the app when it is first initialized, so every setting runs in its
+own process. The settings take turns for ``--rounds`` rounds, so that noise on the
+machine spreads over all of them.
+
+Point DATABASE_URL at a scratch database: the tables are created and filled with
+``--jobs`` jobs before each run, and dropped again at the end.
+
+    DATABASE_URL=sqlite+aiosqlite:///overhead.sqlite python -m benchmarks.sentry_overhead
+"""
+
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+import json
+from os import environ
+import statistics
+import subprocess
+import sys
+import time
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+import sentry_sdk
+from sentry_sdk.transport import Transport
+from sqlalchemy import insert
+
+settings = ("off", "everything (old)", "sampler", "errors only")
+
+
+class CountingTransport(Transport):
+    def __init__(self, options=None):
+        super().__init__(options)
+        self.items: Counter[str] = Counter()
+
+    def capture_envelope(self, envelope):
+        for item in envelope.items:
+            self.items[item.type] += 1
+
+    def capture_event(self, event):
+        self.items[event.get("type", "event")] += 1
+
+
+async def request(
+    app, method: str, path: str, body: bytes = b"", query: str = ""
+) -> int:
+    """Send one request straight to the ASGI app, returns the status code."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1),
+        "server": ("benchmark", 80),
+    }
+    received = False
+    status = 0
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def reset_database(engine: sqlalchemy.ext.asyncio.AsyncEngine, jobs: int):
+    from src.models import URL, Base, Job
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        url_ids = await conn.scalars(
+            insert(URL).returning(URL.id),
+            [{"url": f"https://example.com/{i}"} for i in range(jobs)],
+        )
+        await conn.execute(
+            insert(Job), [{"url_id": url_id, "priority": 0} for url_id in url_ids]
+        )
+
+
+def init_sentry(setting: str, transport: Transport):
+    from src import main as app_main
+    from src.tracing import TracesSampler
+
+    options = {"dsn": "https://public@sentry.invalid/1", "transport": transport}
+    match setting:
+        case "everything (old)":
+            sentry_sdk.init(**options, traces_sample_rate=1.0, profiles_sample_rate=1.0)
+        case "sampler":
+            # Configured like src.main does it
+            sampler = TracesSampler(
+                default_rate=app_main.sentry_traces_sample_rate,
+                rates=app_main.sentry_traces_sample_rates,
+                profiles_rate=app_main.sentry_profiles_sample_rate,
+                slow_capture_rate=app_main.sentry_slow_capture_rate,
+                slow_transaction_seconds=app_main.sentry_slow_transaction_seconds,
+                max_per_minute=app_main.sentry_max_transactions_per_minute,
+            )
+            sentry_sdk.init(
+                **options,
+                traces_sampler=sampler.traces_sampler,
+                profiles_sampler=sampler.profiles_sampler,
+                before_send_transaction=sampler.before_send_transaction,
+            )
+        case "errors only":
+            sentry_sdk.init(**options, traces_sample_rate=0)
+
+
+async def run_setting(args: argparse.Namespace) -> dict:
+    """Run every request with one setting, in this process."""
+    # The app must not initialize Sentry on import, init_sentry() does
+    environ["SENTRY_DSN"] = ""
+    from src import main as app_main
+    from src.routes import load_routes
+
+    app_main.engine = sqlalchemy.ext.asyncio.create_async_engine(
+        environ["DATABASE_URL"]
+    )
+    app_main.async_session = sqlalchemy.ext.asyncio.async_sessionmaker(
+        app_main.engine, expire_on_commit=False
+    )
+    load_routes()
+    await reset_database(app_main.engine, args.jobs)
+    transport = CountingTransport()
+    init_sentry(args.setting, transport)
+
+    batch_body = json.dumps(
+        {"urls": [f"https://example.org/{i}" for i in range(args.batch_size)]}
+    ).encode()
+    routes = {
+        "GET /job/current": ("GET", "/job/current", b"", "", args.requests),
+        "GET /job": ("GET", "/job", b"", "page=2", args.requests),
+        "GET /stats": ("GET", "/stats", b"", "", args.requests),
+        "POST /queue/batch": ("POST", "/queue/batch", batch_body, "", args.batches),
+    }
+    latencies: dict[str, list[float]] = {}
+    for route, (method, path, body, query, repeat) in routes.items():
+        latencies[route] = []
+        # The first request of each route warms up caches
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            status = await request(app_main.app, method, path, body, query)
+            if i:
+                latencies[route].append(time.perf_counter() - start)
+            if status >= 400:
+                raise RuntimeError(f"{route} answered {status}")
+    if sentry_sdk.Hub.current.client is not None:
+        # Sends everything and stops the profiler
+        sentry_sdk.Hub.current.client.close()
+    await app_main.engine.dispose()
+    return {"latencies": latencies, "sent": transport.items}
+
+
+async def drop_tables():
+    from src.models import Base
+
+    engine = sqlalchemy.ext.asyncio.create_async_engine(environ["DATABASE_URL"])
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+def main(args: argparse.Namespace):
+    latencies: dict[str, dict[str, list[float]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    sent: dict[str, Counter[str]] = defaultdict(Counter)
+    try:
+        for round in range(args.rounds):
+            print(f"Round {round + 1} of {args.rounds}...")
+            for setting in settings:
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.sentry_overhead",
+                        f"--setting={setting}",
+                        *sys.argv[1:],
+                    ],
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                ).stdout
+                result = json.loads(output.splitlines()[-1])
+                for route, values in result["latencies"].items():
+                    latencies[setting][route].extend(values)
+                sent[setting].update(result["sent"])
+    finally:
+        asyncio.run(drop_tables())
+
+    baseline = latencies["off"]
+    print(
+        f"Median latency over {args.rounds} x {args.requests} requests "
+        f"({args.rounds} x {args.batches} batches):"
+    )
+    for route in baseline:
+        print(f"  {route}")
+        off = statistics.median(baseline[route])
+        for setting in settings:
+            median = statistics.median(latencies[setting][route])
+            print(
+                f"    {setting:<18} {median * 1000:8.2f} ms"
+                f"  ({(median - off) * 1000:+.2f} ms, {(median - off) / off:+.0%})"
+            )
+    print("Sent to Sentry:")
+    for setting in settings:
+        events = ", ".join(f"{count} {kind}" for kind, count in sent[setting].items())
+        print(f"  {setting:<18} {events or 'nothing'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--batches", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--setting", choices=settings, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///overhead.sqlite")
+    if args.setting:
+        print(json.dumps(asyncio.run(run_setting(args))))
+    else:
+        main(args)
@@ -0,0 +1,203 @@
+"""Measure how fast the workers drain a queue, against a local fake Wayback Machine.
+
+Point DATABASE_URL at a scratch database: the tables are created, filled with
+``--jobs`` jobs for URLs spread over ``--hosts`` hosts, and dropped again
+afterwards. The app's background workers then run against benchmarks.fake_wayback
+until every job is completed, failed or waiting for its next retry (which is
+``min_wait_time_between_archives`` away), or until ``--timeout``.
+
+Reports jobs per second, the p50/p99 time a worker spends on a job (from picking
+it up to recording its result, including rate limiting) and the number of
+statements the app sent to the database per job.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.worker_throughput --jobs 2000
+"""
+
+import argparse
+import asyncio
+import dataclasses
+from itertools import batched
+from os import environ
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+from sqlalchemy import func, insert, select
+
+from benchmarks.fake_wayback import (
+    FakeWaybackConfig,
+    add_arguments,
+    config_from_arguments,
+)
+
+
+async def seed(conn: sqlalchemy.ext.asyncio.AsyncConnection, jobs: int, hosts: int):
+    from src.models import URL, Job
+
+    for chunk in batched(range(jobs), 10000):
+        url_ids = await conn.scalars(
+            insert(URL).returning(URL.id),
+            [
+                {
+                    "url": f"https://site{i % hosts}.example.com/{i}",
+                    "hostname": f"site{i % hosts}.example.com",
+                }
+                for i in chunk
+            ],
+        )
+        await conn.execute(
+            insert(Job),
+            [{"url_id": url_id, "priority": 0, "retry": 0} for url_id in url_ids],
+        )
+
+
+async def wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            await writer.wait_closed()
+            return
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main(args: argparse.Namespace, fake_wayback_config: FakeWaybackConfig):
+    port = free_port()
+    environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///worker_throughput.sqlite")
+    environ["WAYBACK_SAVE_URL"] = f"http://127.0.0.1:{port}/save/"
+    environ["ARCHIVE_WORKER_CONCURRENCY"] = str(args.concurrency)
+    environ["ARCHIVE_PER_HOST_CONCURRENCY"] = str(args.per_host)
+    environ["ARCHIVE_INITIAL_RATE"] = str(args.rate)
+    environ["ARCHIVE_MAX_RATE"] = str(args.rate)
+    environ["ARCHIVE_ATTEMPT_BACKOFF_SECONDS"] = str(args.backoff)
+    # The configuration is read on import
+    from src import main as app_main
+    from src.models import Base, Job
+
+    # The fake server runs in its own process, so that it does not compete with the
+    # workers for the event loop
+    fake_wayback = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_wayback",
+            "--port",
+            str(port),
+            *(
+                f"--{field.name.replace('_', '-')}="
+                f"{getattr(fake_wayback_config, field.name)}"
+                for field in dataclasses.fields(fake_wayback_config)
+            ),
+        ]
+    )
+    engine = sqlalchemy.ext.asyncio.create_async_engine(environ["DATABASE_URL"])
+    try:
+        await wait_for_port(port)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            print(f"Seeding {args.jobs} jobs over {args.hosts} hosts...")
+            await seed(conn, args.jobs, args.hosts)
+
+        latencies: list[float] = []
+        archive_job = app_main.archive_job
+
+        async def timed_archive_job(job: Job):
+            start = time.perf_counter()
+            try:
+                await archive_job(job)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        app_main.archive_job = timed_archive_job
+        statements = 0
+
+        def count_statement(*_):
+            nonlocal statements
+            statements += 1
+
+        remaining_stmt = select(func.count()).where(
+            (Job.completed == None) & (Job.failed == None) & (Job.retry == 0)
+        )
+        async with app_main.lifespan(app_main.app):
+            sqlalchemy.event.listen(
+                app_main.engine.sync_engine, "before_cursor_execute", count_statement
+            )
+            start = time.perf_counter()
+            while time.perf_counter() - start < args.timeout:
+                await asyncio.sleep(0.1)
+                async with engine.connect() as conn:
+                    if not await conn.scalar(remaining_stmt):
+                        break
+            elapsed = time.perf_counter() - start
+        async with engine.connect() as conn:
+            completed = await conn.scalar(
+                select(func.count()).where(Job.completed != None)
+            )
+            failed = await conn.scalar(select(func.count()).where(Job.failed != None))
+            retrying = await conn.scalar(
+                select(func.count()).where(
+                    (Job.completed == None) & (Job.failed == None) & (Job.retry > 0)
+                )
+            )
+    finally:
+        fake_wayback.send_signal(signal.SIGINT)
+        fake_wayback.wait()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+    print(
+        f"{completed} completed, {failed} failed, {retrying} waiting to be retried, "
+        f"{args.jobs - completed - failed - retrying} left after {elapsed:.2f} s"
+    )
+    print(f"Throughput: {completed / elapsed:.2f} jobs/s")
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"Time per archive attempt: p50 {percentiles[49] * 1000:.1f} ms, "
+            f"p99 {percentiles[98] * 1000:.1f} ms over {len(latencies)} attempts"
+        )
+    print(
+        f"Database statements: {statements}, "
+        f"{statements / max(1, completed):.2f} per completed job"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000,
+        help="Requests per second the rate limiter allows (the default practically disables it)",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=0.1,
+        help="ARCHIVE_ATTEMPT_BACKOFF_SECONDS, so that failed attempts are retried quickly",
+    )
+    parser.add_argument("--timeout", type=float, default=600)
+    add_arguments(parser.add_argument_group("fake Wayback Machine"))
+    args = parser.parse_args()
+    asyncio.run(main(args, config_from_arguments(args)))
@@ -20,9 +20,11 @@ export interface Paginated<T> {
   data: T[];
   pagination: {
     current_page: number;
-    total_pages: number;
-    items: number;
+    total_pages: number | null;
+    items: number | null;
+    count: "exact" | "cached" | "estimated" | "none";
   };
+  next_cursor?: string | null;
 }
 
 export type PaginatedJob = Paginated<Job>;
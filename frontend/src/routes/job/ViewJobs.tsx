@@ -203,7 +203,10 @@ export default function ViewJobs({ height = "80vh", url = "/job/grid_sort" }) {
         }}
         serverSideDatasource={{
           getRows(params: IServerSideGetRowsParams<Job>) {
-            fetch(url, {
+            // Only the first block is counted, the grid keeps its row count while
+            // loading the blocks after it
+            const count = params.request.startRow ? "none" : "exact";
+            fetch(`${url}${url.includes("?") ? "&" : "?"}count=${count}`, {
               body: JSON.stringify(params.request),
               method: "POST",
               headers: {
@@ -211,7 +214,12 @@ export default function ViewJobs({ height = "80vh", url = "/job/grid_sort" }) {
               },
             })
               .then((res) => res.json())
-              .then((data: LoadSuccessParams) => params.success(data))
+              .then((data: LoadSuccessParams) =>
+                params.success({
+                  ...data,
+                  rowCount: data.rowCount ?? undefined,
+                }),
+              )
               .catch(() => params.fail());
           },
         }}
@@ -0,0 +1,82 @@
+import datetime
+import json
+from typing import Literal
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+
+# exact: COUNT(*), cached: a COUNT(*) result up to the TTL old, estimated: the query
+# planner's estimate, none: not counted
+CountStrategy = Literal["exact", "cached", "estimated", "none"]
+
+
+class RowCounter:
+    """Counts the rows of the filtered queries behind paginated responses.
+
+    ``COUNT(*)`` reads every matching row, which on a large table costs far more than
+    the page it comes with. Cached counts are reused for ``cache_ttl``, per query and
+    parameters. Estimates come from the Postgres query planner's statistics, which
+    are cheap but can be far off for selective filters. Other databases do not expose
+    estimates, so they are counted exactly instead.
+    """
+
+    def __init__(self, cache_ttl: datetime.timedelta, max_cached: int = 1000):
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        # SQL (with its parameters) -> (expires, count), oldest first
+        self._cache: dict[str, tuple[datetime.datetime, int]] = {}
+
+    async def count(
+        self,
+        session: sqlalchemy.ext.asyncio.AsyncSession,
+        stmt: sqlalchemy.Select[tuple[int]],
+        strategy: CountStrategy,
+    ) -> tuple[int | None, CountStrategy]:
+        """Run a ``SELECT count(...)`` statement the requested way.
+
+        :return: The count, and the strategy that was actually used
+        """
+        if strategy == "none":
+            return None, strategy
+        conn = await session.connection()
+        if strategy == "estimated":
+            if conn.dialect.name == "postgresql":
+                return await self._estimate(conn, stmt), strategy
+            strategy = "exact"
+        if strategy == "exact":
+            return await conn.scalar(stmt), strategy
+
+        curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+        key = self._compile(conn, stmt)
+        if (cached := self._cache.get(key)) is not None and cached[0] > curtime:
+            return cached[1], strategy
+        count = await conn.scalar(stmt)
+        self._cache.pop(key, None)
+        self._cache[key] = (curtime + self.cache_ttl, count)
+        for expired in [
+            key for key, (expires, _) in self._cache.items() if expires <= curtime
+        ]:
+            del self._cache[expired]
+        while len(self._cache) > self.max_cached:
+            del self._cache[next(iter(self._cache))]
+        return count, "exact"
+
+    @staticmethod
+    def _compile(
+        conn: sqlalchemy.ext.asyncio.AsyncConnection, stmt: sqlalchemy.Select
+    ) -> str:
+        return str(stmt.compile(conn, compile_kwargs={"literal_binds": True}))
+
+    async def _estimate(
+        self, conn: sqlalchemy.ext.asyncio.AsyncConnection, stmt: sqlalchemy.Select
+    ) -> int:
+        # The estimate for the rows that would be counted, the one for the count is 1
+        rows = stmt.with_only_columns(
+            sqlalchemy.literal_column("1"), maintain_column_froms=True
+        )
+        result = await conn.scalar(
+            sqlalchemy.text(f"EXPLAIN (FORMAT JSON) {self._compile(conn, rows)}")
+        )
+        if isinstance(result, str):
+            result = json.loads(result)
+        return int(result[0]["Plan"]["Plan Rows"])
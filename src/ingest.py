@@ -0,0 +1,148 @@
+import asyncio
+import codecs
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, TypeVar
+
+from fastapi import UploadFile
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+from sqlalchemy import insert, select
+
+from .models import URL, BatchJobs, Job, url_hostname
+
+T = TypeVar("T")
+
+
+def _insert_urls_ignoring_duplicates(dialect_name: str) -> sqlalchemy.Insert:
+    match dialect_name:
+        case "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        case "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        case _:
+            raise NotImplementedError(f"URLs cannot be upserted on {dialect_name}")
+    return (
+        dialect_insert(URL.__table__)
+        .on_conflict_do_nothing(index_elements=[URL.url])
+        .returning(URL.id, URL.url)
+    )
+
+
+async def upsert_urls(
+    session: sqlalchemy.ext.asyncio.AsyncSession, urls: Iterable[str]
+) -> dict[str, int]:
+    """Insert the URLs that do not exist yet, and return the ID of every URL.
+
+    Existing URLs are looked up first, the rest come back from ``INSERT ... ON
+    CONFLICT DO NOTHING RETURNING``. URLs inserted by someone else in the meantime are
+    looked up again. Keep the number of URLs below the database's bind parameter
+    limit (about 30000).
+    """
+    from .main import stats_counters
+
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    # Core statements on the connection skip the ORM's bulk insert machinery
+    conn = await session.connection()
+    result = await conn.execute(select(URL.url, URL.id).where(URL.url.in_(urls)))
+    url_ids: dict[str, int] = dict(result.tuples().all())
+    if missing := [url for url in urls if url not in url_ids]:
+        result = await conn.execute(
+            _insert_urls_ignoring_duplicates(conn.dialect.name),
+            [{"url": url, "hostname": url_hostname(url)} for url in missing],
+        )
+        inserted = result.all()
+        stats_counters.changes(session).urls += len(inserted)
+        url_ids.update((url, url_id) for url_id, url in inserted)
+        if raced := [url for url in missing if url not in url_ids]:
+            result = await conn.execute(
+                select(URL.url, URL.id).where(URL.url.in_(raced))
+            )
+            url_ids.update(result.tuples().all())
+    return url_ids
+
+
+async def insert_jobs(
+    session: sqlalchemy.ext.asyncio.AsyncSession, batch_id: int, jobs: list[dict]
+) -> list[int]:
+    """Insert jobs (given as ``Job`` column values) and add them to a batch, in bulk.
+
+    Returns the IDs of the new jobs, in the order of ``jobs``. The batch is not
+    checked for being locked.
+    """
+    from .main import stats_counters
+
+    if not jobs:
+        return []
+    conn = await session.connection()
+    result = await conn.scalars(
+        insert(Job.__table__).returning(Job.id, sort_by_parameter_order=True), jobs
+    )
+    job_ids = result.all()
+    await conn.execute(
+        insert(BatchJobs.__table__),
+        [{"batch_id": batch_id, "job_id": job_id} for job_id in job_ids],
+    )
+    stats_counters.changes(session).jobs_created(jobs)
+    return job_ids
+
+
+async def url_ids_in_batch(
+    session: sqlalchemy.ext.asyncio.AsyncSession, batch_id: int, url_ids: Iterable[int]
+) -> set[int]:
+    """Which of the URLs already have a job in the batch."""
+    result = await session.scalars(
+        select(Job.url_id)
+        .join(BatchJobs, BatchJobs.job_id == Job.id)
+        .where((BatchJobs.batch_id == batch_id) & Job.url_id.in_(list(url_ids)))
+    )
+    return set(result.all())
+
+
+async def async_batched(iterable: AsyncIterable[T], n: int) -> AsyncIterator[list[T]]:
+    """Like ``itertools.batched``, for async iterables."""
+    chunk: list[T] = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == n:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def batched_in_thread(iterator: Iterator[T], n: int) -> AsyncIterator[list[T]]:
+    """Like ``itertools.batched``, but takes every batch in a thread.
+
+    For iterators that read and parse files, so that the event loop stays free.
+    """
+    while chunk := await asyncio.to_thread(lambda: list(islice(iterator, n))):
+        yield chunk
+
+
+async def stream_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """The lines of a UTF-8 byte stream (such as a request body), without line endings."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for data in chunks:
+        # The last piece may continue in the next chunk
+        *lines, pending = (pending + decoder.decode(data)).split("\n")
+        for line in lines:
+            yield line.removesuffix("\r")
+    if pending := pending + decoder.decode(b"", final=True):
+        yield pending.removesuffix("\r")
+
+
+async def upload_lines(
+    file: UploadFile, read_size: int = 1 << 16
+) -> AsyncIterator[str]:
+    """The non-empty lines of an uploaded text file, read a piece at a time."""
+
+    async def chunks():
+        while data := await file.read(read_size):
+            yield data
+
+    async for line in stream_lines(chunks()):
+        if line:
+            yield line
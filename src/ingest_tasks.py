@@ -0,0 +1,294 @@
+import asyncio
+import datetime
+from itertools import islice
+import os
+import pathlib
+from traceback import print_exc
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Iterator,
+    NamedTuple,
+    TextIO,
+)
+import uuid
+
+import sqlalchemy.ext.asyncio
+from sqlalchemy import select, update
+
+from . import metrics
+from .ingest import batched_in_thread
+from .models import Batch, BatchTag, IngestTask
+
+
+class RowError(NamedTuple):
+    """Yielded by a reader in place of a row that cannot be ingested."""
+
+    error: str
+
+
+class IngestKind(NamedTuple):
+    # Yields the rows of a spooled payload (None for rows that are skipped on purpose)
+    read: Callable[[TextIO, dict], Iterator[Any]]
+    # Ingests a chunk of rows into the batch, returns the number of new jobs per state
+    ingest: Callable[
+        [sqlalchemy.ext.asyncio.AsyncSession, int, list, dict],
+        Awaitable[dict[str, int]],
+    ]
+    # Label of metrics.jobs_created_total
+    source: str
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class IngestTasks:
+    """Ingests large payloads in the background, from a spool directory.
+
+    :meth:`submit` writes a payload to the spool directory and records an
+    :class:`IngestTask` for it, so that the request that sent it can return right
+    away. :meth:`run` ingests one task at a time, ``chunk_size`` rows per
+    transaction. Each transaction also records how many rows are done and renews the
+    task's lease, so a task interrupted by a restart (or a crash) is resumed after the
+    last committed chunk once its lease has run out, by any process sharing the spool
+    directory. A task whose payload is missing from the spool directory is failed.
+
+    Payload kinds are registered by the routes that accept them, see
+    :meth:`register`.
+    """
+
+    def __init__(
+        self,
+        spool_dir: pathlib.Path,
+        *,
+        chunk_size: int,
+        lease_duration: datetime.timedelta,
+        poll_interval: float,
+        max_errors: int = 100,
+    ):
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.lease_duration = lease_duration
+        self.poll_interval = poll_interval
+        self.max_errors = max_errors
+        self.kinds: dict[str, IngestKind] = {}
+        self._submitted = asyncio.Event()
+        self._current: int | None = None
+
+    def register(self, kind: str, ingest_kind: IngestKind):
+        self.kinds[kind] = ingest_kind
+
+    async def submit(
+        self,
+        kind: str,
+        options: dict,
+        payload: Callable[[BinaryIO], None] | AsyncIterable[bytes],
+    ) -> int:
+        """Spool a payload and record a task to ingest it.
+
+        :param kind: A registered payload kind
+        :param options: Passed to the kind's reader and ingester, must be JSON
+        :param payload: Either a function that writes the payload to the file it is
+            given (called in a thread), or the payload as a stream, e.g. a request body
+        :return: The task's ID
+        """
+        from .main import async_session
+
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown ingest task kind {kind}")
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        spool_file = f"{uuid.uuid4().hex}.{kind}"
+        path = self.spool_dir / spool_file
+
+        try:
+            file = await asyncio.to_thread(open, path, "wb")
+            try:
+                if callable(payload):
+                    await asyncio.to_thread(payload, file)
+                else:
+                    async for data in payload:
+                        await asyncio.to_thread(file.write, data)
+                await asyncio.to_thread(file.flush)
+                # The task must not be recorded before its payload is safe
+                await asyncio.to_thread(os.fsync, file.fileno())
+            finally:
+                file.close()
+            async with async_session() as session, session.begin():
+                task = IngestTask(kind=kind, spool_file=spool_file, options=options)
+                session.add(task)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        self._submitted.set()
+        return task.id
+
+    async def _claim(self) -> IngestTask | None:
+        """Lease the oldest unfinished task, failing the ones whose payload is gone."""
+        from .main import async_session, worker_id
+
+        curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+        claimable = (IngestTask.finished_at == None) & (
+            (IngestTask.lease_expires == None)
+            | (IngestTask.lease_expires < curtime)
+            # Left behind by this process before a restart
+            | (IngestTask.claimed_by == worker_id)
+        )
+        async with async_session() as session, session.begin():
+            result = await session.scalars(
+                select(IngestTask).where(claimable).order_by(IngestTask.id)
+            )
+            for task in result.all():
+                path = self.spool_dir / task.spool_file
+                if not path.exists():
+                    await session.execute(
+                        update(IngestTask)
+                        .where((IngestTask.id == task.id) & claimable)
+                        .values(
+                            finished_at=curtime,
+                            error=f"Payload file {path} is missing",
+                            claimed_by=None,
+                            lease_expires=None,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                    print(f"Failed ingest task {task.id}, {path} is missing.")
+                    continue
+                result = await session.execute(
+                    update(IngestTask)
+                    .where((IngestTask.id == task.id) & claimable)
+                    .values(
+                        claimed_by=worker_id,
+                        lease_expires=curtime + self.lease_duration,
+                        started_at=sqlalchemy.func.coalesce(
+                            IngestTask.started_at, curtime
+                        ),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    await session.refresh(task)
+                    return task
+        return None
+
+    async def _ingest_chunk(self, task: IngestTask, kind: IngestKind, chunk: list):
+        from .main import async_session, stats_counters, worker_id
+
+        errors = []
+        rows = []
+        for number, row in enumerate(chunk, start=task.rows_processed + 1):
+            if isinstance(row, RowError):
+                errors.append({"row": number, "error": row.error})
+            elif row is not None:
+                rows.append(row)
+        counts: dict[str, int] = {}
+        async with async_session() as session, session.begin():
+            batch_id = task.batch_id
+            if batch_id is None:
+                batch = Batch(
+                    tags=await BatchTag.resolve_list(set(task.options.get("tags", [])))
+                )
+                session.add(batch)
+                await session.flush()
+                stats_counters.changes(session).batches += 1
+                batch_id = batch.id
+            if rows:
+                counts = await kind.ingest(session, batch_id, rows, task.options)
+            task_errors = (task.errors + errors)[: self.max_errors]
+            result = await session.execute(
+                update(IngestTask)
+                .where(
+                    (IngestTask.id == task.id) & (IngestTask.claimed_by == worker_id)
+                )
+                .values(
+                    rows_processed=task.rows_processed + len(chunk),
+                    error_count=task.error_count + len(errors),
+                    errors=task_errors,
+                    batch_id=batch_id,
+                    lease_expires=datetime.datetime.now(tz=datetime.timezone.utc)
+                    + self.lease_duration,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                # Resumed by another process, after this one stalled for a whole lease
+                raise LeaseLost(task.id)
+        task.rows_processed += len(chunk)
+        task.error_count += len(errors)
+        task.errors = task_errors
+        task.batch_id = batch_id
+        metrics.jobs_created_total.inc(sum(counts.values()), source=kind.source)
+
+    async def _finish(self, task: IngestTask, error: str | None = None):
+        from .main import async_session, worker_id
+
+        async with async_session() as session, session.begin():
+            await session.execute(
+                update(IngestTask)
+                .where(
+                    (IngestTask.id == task.id) & (IngestTask.claimed_by == worker_id)
+                )
+                .values(
+                    finished_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                    error=error,
+                    claimed_by=None,
+                    lease_expires=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        (self.spool_dir / task.spool_file).unlink(missing_ok=True)
+
+    async def process(self, task: IngestTask):
+        kind = self.kinds[task.kind]
+        with open(
+            self.spool_dir / task.spool_file, encoding="utf-8", newline=""
+        ) as file:
+            rows = kind.read(file, task.options)
+            # Parsing runs in a thread, so that large payloads do not block the event loop
+            skip = task.rows_processed
+            await asyncio.to_thread(lambda: next(islice(rows, skip, skip), None))
+            async for chunk in batched_in_thread(rows, self.chunk_size):
+                await self._ingest_chunk(task, kind, chunk)
+
+    async def release(self):
+        """Let another process (or this one, after a restart) resume the current task."""
+        from .main import async_session, worker_id
+
+        if self._current is None:
+            return
+        async with async_session() as session, session.begin():
+            await session.execute(
+                update(IngestTask)
+                .where(
+                    (IngestTask.id == self._current)
+                    & (IngestTask.claimed_by == worker_id)
+                )
+                .values(claimed_by=None, lease_expires=None)
+                .execution_options(synchronize_session=False)
+            )
+        self._current = None
+
+    async def run(self):
+        while True:
+            self._submitted.clear()
+            task = await self._claim()
+            if task is None:
+                try:
+                    await asyncio.wait_for(self._submitted.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+            self._current = task.id
+            try:
+                await self.process(task)
+            except LeaseLost:
+                print(f"Ingest task {task.id} was taken over by another process.")
+            except Exception as e:
+                print_exc()
+                await self._finish(task, error=f"{type(e).__name__}: {e}")
+            else:
+                await self._finish(task)
+            self._current = None
@@ -0,0 +1,292 @@
+"""In-memory metrics, served in the Prometheus text format by ``/metrics``.
+
+Every value lives in this process and is updated where the event happens, so that
+scraping never touches the database. Job counts by state come from the counters behind
+``/stats`` (see src/stats_counters.py), which pick up changes made by other processes
+sharing the database when they are reconciled.
+"""
+
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import sqlalchemy
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up. The name must end in ``_total``."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+        if not labelnames:
+            self.values[()] = 0
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self.values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is computed by ``function`` on every scrape.
+
+    ``function`` returns the value of an unlabelled gauge, or a mapping from label
+    values to values.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        function: Callable[[], float | dict[tuple[str, ...], float]] | None = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels: str):
+        self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.function is not None:
+            value = self.function()
+            self.values = value if isinstance(value, dict) else {(): value}
+        return super()._samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...],
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Label values -> (per-bucket counts, sum)
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * len(self.buckets), [0.0])
+        counts, total = self.values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe how long the ``with`` block takes, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in self.values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total[0]
+            yield f"{self.name}_count", labels, cumulative
+
+
+registry: list[Metric] = []
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+# Job lifecycle
+def _jobs() -> dict[tuple[str, ...], float]:
+    from .main import stats_counters
+
+    counts = {("pending",): 0, ("completed",): 0, ("failed",): 0}
+    for (state, _), count in stats_counters.jobs.items():
+        counts[(state,)] += count
+    return counts
+
+
+jobs = Gauge(
+    "archiver_jobs",
+    "Jobs in the database by state, as seen by this process",
+    ("state",),
+    function=_jobs,
+)
+jobs_created_total = Counter(
+    "archiver_jobs_created_total",
+    "Jobs created by this process, by source (batch, import or repeat_url)",
+    ("source",),
+)
+archive_attempts_total = Counter(
+    "archiver_archive_attempts_total",
+    "Archive attempts by outcome (completed, failed_attempt, retried or failed)",
+    ("outcome",),
+)
+duplicate_jobs_completed_total = Counter(
+    "archiver_duplicate_jobs_completed_total",
+    "Pending jobs completed with the snapshot of another job for the same URL",
+)
+lost_job_leases_total = Counter(
+    "archiver_lost_job_leases_total",
+    "Archive results dropped because another worker took over the job's lease first",
+)
+jobs_delayed_total = Counter(
+    "archiver_jobs_delayed_total",
+    "Jobs pushed back because their URL was archived less than min_wait_time_between_archives ago",
+)
+job_delay_seconds = Histogram(
+    "archiver_job_delay_seconds",
+    "How far back jobs were pushed because of min_wait_time_between_archives",
+    buckets=(60, 300, 600, 900, 1800, 2700, 3600),
+)
+
+# Latencies
+dispatch_query_seconds = Histogram(
+    "archiver_dispatch_query_seconds",
+    "Time taken to claim the next jobs from the database",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+archive_request_seconds = Histogram(
+    "archiver_archive_request_seconds",
+    "Time from sending a save request until its response headers, by HTTP status (or error)",
+    ("status",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+write_buffer_flush_seconds = Histogram(
+    "archiver_write_buffer_flush_seconds",
+    "Time taken to write a batch of buffered job updates",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+# Worker state, read from src.main on every scrape
+def _worker_jobs() -> dict[tuple[str, ...], float]:
+    from .main import claimed_jobs, hosts_in_flight, job_updates, ready_queue
+
+    return {
+        ("ready_queue",): len(ready_queue),
+        ("archiving",): sum(hosts_in_flight.values()),
+        ("awaiting_write",): len(job_updates),
+        ("claimed",): len(claimed_jobs),
+    }
+
+
+def _archive_rate() -> float:
+    from .main import archive_rate_limiter
+
+    return archive_rate_limiter.state().rate
+
+
+def _db_pool() -> dict[tuple[str, ...], float]:
+    from .main import engine
+
+    # Only pools that keep connections around have anything to report (SQLite uses
+    # a NullPool)
+    if engine is None or not isinstance(engine.pool, sqlalchemy.pool.QueuePool):
+        return {}
+    pool = engine.pool
+    return {
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+    }
+
+
+def _db_pool_size() -> float:
+    from .main import engine
+
+    if engine is None or not isinstance(engine.pool, sqlalchemy.pool.QueuePool):
+        return math.nan
+    return engine.pool.size()
+
+
+worker_jobs = Gauge(
+    "archiver_worker_jobs",
+    "Jobs held by this process: prefetched in the ready queue, being archived, "
+    "archived but not written yet, and claimed in total",
+    ("state",),
+    function=_worker_jobs,
+)
+archive_rate = Gauge(
+    "archiver_archive_rate",
+    "Save requests per second currently allowed by the rate limiter",
+    function=_archive_rate,
+)
+db_pool_connections = Gauge(
+    "archiver_db_pool_connections",
+    "Database connections in the pool, by state",
+    ("state",),
+    function=_db_pool,
+)
+db_pool_size = Gauge(
+    "archiver_db_pool_size",
+    "Connections the pool keeps open, more can be opened as overflow",
+    function=_db_pool_size,
+)
@@ -1,11 +1,25 @@
 import datetime
 from typing import Self
+from urllib.parse import urlsplit
 from sqlalchemy import select
 from sqlalchemy.orm import Mapped, mapped_column
 import sqlalchemy.ext.asyncio
 import sqlalchemy.orm
 
 
+# SQLite only auto-increments INTEGER PRIMARY KEY columns
+BigIntegerPK = sqlalchemy.BigInteger().with_variant(sqlalchemy.Integer(), "sqlite")
+
+
+def url_hostname(url: str) -> str | None:
+    """The host part of a URL, which jobs are spread across when dispatching."""
+    try:
+        hostname = urlsplit(url.strip()).hostname
+    except ValueError:  # Malformed, e.g. an unclosed IPv6 literal
+        return None
+    return hostname[:256] if hostname else None
+
+
 class Base(
     sqlalchemy.orm.MappedAsDataclass,
     sqlalchemy.ext.asyncio.AsyncAttrs,
@@ -125,6 +139,12 @@ class URL(Base):
     last_seen: Mapped[datetime.datetime | None] = mapped_column(
         sqlalchemy.DateTime(timezone=True), default=None, nullable=True, index=True
     )
+    hostname: Mapped[str | None] = mapped_column(
+        sqlalchemy.String(length=256), nullable=True, init=False, index=True
+    )
+
+    def __post_init__(self):
+        self.hostname = url_hostname(self.url)
 
 
 class RepeatURL(Base):
@@ -166,13 +186,20 @@ class RepeatURL(Base):
         index=True,
         init=False,
     )  # Indicates that a repeat URL is active
+    next_due_at: Mapped[datetime.datetime] = mapped_column(
+        sqlalchemy.DateTime(timezone=True),
+        insert_default=sqlalchemy.sql.func.now(),
+        nullable=False,
+        index=True,
+        init=False,
+    )  # When the URL should be queued again, unless it was captured since
 
 
 class BatchJobs(Base):
     __tablename__ = "batch_jobs"
 
     id: Mapped[int] = mapped_column(
-        sqlalchemy.BigInteger, primary_key=True, autoincrement=True, init=False
+        BigIntegerPK, primary_key=True, autoincrement=True, init=False
     )
     batch_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey(Batch.id), index=True)
     job_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("jobs.id"), index=True)
@@ -199,7 +226,7 @@ class Job(Base):
     __tablename__ = "jobs"
 
     id: Mapped[int] = mapped_column(
-        sqlalchemy.BigInteger, primary_key=True, autoincrement=True, init=False
+        BigIntegerPK, primary_key=True, autoincrement=True, init=False
     )
     url_id: Mapped[int] = mapped_column(
         sqlalchemy.ForeignKey(URL.id),
@@ -231,12 +258,90 @@ class Job(Base):
     retry: Mapped[int] = mapped_column(
         sqlalchemy.SmallInteger, default=0
     )  # Number of times this job has been retried
+    attempts: Mapped[int] = mapped_column(
+        sqlalchemy.SmallInteger, default=0, server_default="0"
+    )  # Number of failed archive attempts in the current retry
     failed: Mapped[datetime.datetime | None] = mapped_column(
         sqlalchemy.DateTime(timezone=True), default=None, nullable=True, index=True
     )  # If a job has failed, this is the time it failed at
+    claimed_by: Mapped[str | None] = mapped_column(
+        sqlalchemy.String(length=256),
+        default=None,
+        nullable=True,
+        index=True,
+        repr=False,
+    )  # The worker that currently holds the lease on this job
+    lease_expires: Mapped[datetime.datetime | None] = mapped_column(
+        sqlalchemy.DateTime(timezone=True),
+        default=None,
+        nullable=True,
+        index=True,
+        repr=False,
+    )  # Once this time passes without a heartbeat, any worker may reclaim the job
 
     @sqlalchemy.orm.validates("batches")
     def validate_not_locked_batch(self, key: str, batch: Batch) -> Batch:
         if batch.locked:
             raise ValueError("Batch is locked")
         return batch
+
+
+# Matches the queue order that src.main.claimable_jobs_query reads its candidates in
+# (and src.main.dispatch_order sorts by), so that finding the next jobs is an index
+# walk over pending jobs only instead of a scan and sort of every job ever queued.
+# The candidates are then ranked by host, see claimable_jobs_query.
+sqlalchemy.Index(
+    "ix_jobs_pending_dispatch",
+    Job.priority.desc(),
+    Job.retry.desc(),
+    Job.id,
+    postgresql_where=(Job.completed == None) & (Job.failed == None),
+    sqlite_where=(Job.completed == None) & (Job.failed == None),
+)
+
+
+class IngestTask(Base):
+    __tablename__ = "ingest_tasks"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, init=False)
+    kind: Mapped[str] = mapped_column(
+        sqlalchemy.String(length=32)
+    )  # How the spooled payload is read and ingested, see src.ingest_tasks
+    spool_file: Mapped[str] = mapped_column(
+        sqlalchemy.String(length=256)
+    )  # Name of the payload's file in INGEST_SPOOL_DIR, shared by every process
+    options: Mapped[dict] = mapped_column(
+        sqlalchemy.JSON
+    )  # Priority, tags and the like, as given to the endpoint
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        sqlalchemy.DateTime(timezone=True),
+        server_default=sqlalchemy.sql.func.now(),
+        nullable=False,
+        init=False,
+        index=True,
+    )
+    started_at: Mapped[datetime.datetime | None] = mapped_column(
+        sqlalchemy.DateTime(timezone=True), default=None, nullable=True
+    )
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(
+        sqlalchemy.DateTime(timezone=True), default=None, nullable=True, index=True
+    )
+    rows_processed: Mapped[int] = mapped_column(
+        sqlalchemy.BigInteger, default=0, server_default="0"
+    )  # Rows of the payload that are ingested (or rejected) and committed
+    error_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    errors: Mapped[list] = mapped_column(
+        sqlalchemy.JSON, default_factory=list
+    )  # The first rejected rows, as {"row": ..., "error": ...}
+    error: Mapped[str | None] = mapped_column(
+        sqlalchemy.Text, default=None, nullable=True
+    )  # Why the task failed as a whole
+    batch_id: Mapped[int | None] = mapped_column(
+        sqlalchemy.ForeignKey(Batch.id), default=None, nullable=True
+    )
+    claimed_by: Mapped[str | None] = mapped_column(
+        sqlalchemy.String(length=256), default=None, nullable=True, repr=False
+    )  # The process that is ingesting the payload
+    lease_expires: Mapped[datetime.datetime | None] = mapped_column(
+        sqlalchemy.DateTime(timezone=True), default=None, nullable=True, repr=False
+    )  # Renewed with every committed chunk, a task whose lease ran out is resumed
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from pydantic import BaseModel
+
+
+class RateLimiterPermit:
+    """Handed out for each request, the caller fills in how the request went."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.status: int | None = None  # Left unset if the request raised
+        self.retry_after: float | None = None
+
+
+class RateLimiterState(BaseModel):
+    rate: float
+    concurrency_limit: int
+    in_flight: int
+    paused_for: float
+    healthy: int
+    throttled: int
+    errors: int
+    slow: int
+    last_decrease: datetime.datetime | None
+
+
+class AdaptiveRateLimiter:
+    """AIMD (additive increase, multiplicative decrease) limiter for an HTTP endpoint.
+
+    Requests are paced to ``rate`` per second and at most ``concurrency_limit`` run at
+    once. Healthy responses grow the rate by ``rate_increase`` per second and the
+    concurrency limit by about one per round of requests, while a response that says
+    the endpoint is overloaded (429 or 503) or a slow response multiplies both by
+    ``decrease_factor``. Only requests started after the last decrease can trigger
+    another one, so a burst of them backs off once. Other errors (other 5xx, such as
+    the 520 and 523 the Wayback Machine returns for a dead site, and exceptions) are
+    failures of that URL only and leave the limits alone, unless they were slow too:
+    a timeout backs off like any other slow response.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_rate: float,
+        min_rate: float,
+        max_rate: float,
+        max_concurrency: int,
+        slow_response_seconds: float,
+        rate_increase: float = 0.05,
+        decrease_factor: float = 0.5,
+    ):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = max(1.0, max_concurrency / 2)
+        self.max_concurrency = max_concurrency
+        self.slow_response_seconds = slow_response_seconds
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.healthy = 0
+        self.throttled = 0
+        self.errors = 0
+        self.slow = 0
+        self.last_decrease: datetime.datetime | None = None
+        self._last_decrease_monotonic = 0.0
+        self._next_send = 0.0
+        self._paused_until = 0.0
+        self._slots = asyncio.Condition()
+        self._pacing = asyncio.Lock()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self.concurrency)
+
+    @asynccontextmanager
+    async def permit(self) -> AsyncIterator[RateLimiterPermit]:
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < self.concurrency_limit)
+            self.in_flight += 1
+        try:
+            async with self._pacing:
+                delay = max(self._next_send, self._paused_until) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._next_send = time.monotonic() + 1 / self.rate
+            permit = RateLimiterPermit()
+            try:
+                yield permit
+            finally:
+                self._record(permit)
+        finally:
+            async with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    def _record(self, permit: RateLimiterPermit):
+        now = time.monotonic()
+        slow = now - permit.started > self.slow_response_seconds
+        if permit.status in (429, 503):
+            self.throttled += 1
+            if permit.retry_after:
+                self._paused_until = max(self._paused_until, now + permit.retry_after)
+        elif permit.status is None or permit.status >= 500:
+            self.errors += 1
+            if not slow:
+                return
+        elif slow:
+            self.slow += 1
+        else:
+            self.healthy += 1
+            # About self.rate responses arrive per second
+            self.rate = min(self.max_rate, self.rate + self.rate_increase / self.rate)
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+            return
+        if permit.started < self._last_decrease_monotonic:
+            return  # Already backed off for requests that were in flight back then
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+        self._last_decrease_monotonic = now
+        self.last_decrease = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    def state(self) -> RateLimiterState:
+        return RateLimiterState(
+            rate=self.rate,
+            concurrency_limit=self.concurrency_limit,
+            in_flight=self.in_flight,
+            paused_for=max(0.0, self._paused_until - time.monotonic()),
+            healthy=self.healthy,
+            throttled=self.throttled,
+            errors=self.errors,
+            slow=self.slow,
+            last_decrease=self.last_decrease,
+        )
@@ -0,0 +1,126 @@
+import heapq
+import itertools
+import time
+from typing import Container
+
+from . import metrics
+from .models import Job
+
+
+class ReadyQueue:
+    """Jobs that were claimed ahead of time, by priority and then in the order they were claimed.
+
+    Refilling claims the next batch of jobs with one query instead of one query per
+    job. Since prefetched jobs are already leased to this process, queueing
+    higher-priority work has to :meth:`invalidate` the queue so that the prefetched
+    jobs are handed back and the next refill picks up the new jobs first.
+
+    A refill claims at most ``per_host`` jobs per host, so a large batch for one site
+    cannot crowd out every other site, and the queue is refilled once it runs low on
+    jobs for hosts that are not busy. If a refill comes back short (the backlog is
+    mostly for busy hosts), the queue is only refilled again after
+    ``short_refill_interval`` seconds, once it is empty, or once new jobs are queued.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        low_water_mark: int,
+        per_host: int | None = None,
+        short_refill_interval: float = 0,
+    ):
+        self.size = size
+        self.low_water_mark = low_water_mark
+        self.per_host = per_host
+        self.short_refill_interval = short_refill_interval
+        self._heap: list[tuple[int, int, int, Job]] = []
+        self._stale = False
+        self._short_refill_at: float | None = None
+        # Keeps the host rotation of the dispatch query within each priority
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _usable(self, skip_hosts: Container[str | None]) -> int:
+        return sum(1 for key in self._heap if key[-1].url.hostname not in skip_hosts)
+
+    def needs_refill(self, skip_hosts: Container[str | None] = ()) -> bool:
+        """Whether the queue is stale or running low on jobs for hosts not in ``skip_hosts``."""
+        if self._stale or not self._heap:
+            return True
+        if self._usable(skip_hosts) >= self.low_water_mark:
+            return False
+        return (
+            self._short_refill_at is None
+            or time.monotonic() - self._short_refill_at >= self.short_refill_interval
+        )
+
+    def push(self, job: Job):
+        heapq.heappush(self._heap, (-job.priority, next(self._sequence), job.id, job))
+
+    def pop(self, skip_hosts: Container[str | None] = ()) -> Job | None:
+        """Take the next job whose URL's host is not in ``skip_hosts``."""
+        skipped = []
+        next_job = None
+        while self._heap:
+            key = heapq.heappop(self._heap)
+            if key[-1].url.hostname in skip_hosts:
+                skipped.append(key)
+                continue
+            next_job = key[-1]
+            break
+        for key in skipped:
+            heapq.heappush(self._heap, key)
+        return next_job
+
+    def invalidate(self, priority: int):
+        """Mark the queue as stale if work of the given priority should run before what it holds."""
+        if self._heap and priority > min(-key[0] for key in self._heap):
+            self._stale = True
+        # The new jobs may be for other hosts
+        self._short_refill_at = None
+
+    async def refill(
+        self, claimed_jobs: dict[int, int], skip_hosts: Container[str | None] = ()
+    ):
+        """Claim jobs until the queue is full again.
+
+        If the queue is full of jobs for hosts in ``skip_hosts``, it is allowed to grow
+        past its size by up to ``low_water_mark`` jobs.
+
+        :param claimed_jobs: The Job ID -> URL ID mapping of every job leased by this
+            process, which is kept up to date as jobs are claimed and released
+        :param skip_hosts: Hosts whose jobs cannot be dispatched right now
+        """
+        from .main import claim_jobs, release_jobs
+
+        if self._stale:
+            stale_ids = [key[2] for key in self._heap]
+            self._heap.clear()
+            self._stale = False
+            await release_jobs(stale_ids)
+            for job_id in stale_ids:
+                del claimed_jobs[job_id]
+        limit = max(
+            self.size - len(self._heap),
+            self.low_water_mark - self._usable(skip_hosts),
+        )
+        if limit <= 0:
+            return
+        claimed_urls = set(claimed_jobs.values())
+        with metrics.dispatch_query_seconds.time():
+            jobs = await claim_jobs(
+                limit, exclude_urls=claimed_urls, per_host=self.per_host
+            )
+        self._short_refill_at = time.monotonic() if len(jobs) < limit else None
+        duplicates: list[int] = []
+        for job in jobs:
+            if job.url_id in claimed_urls:
+                # Another job for the same URL was claimed in the same query
+                duplicates.append(job.id)
+                continue
+            claimed_jobs[job.id] = job.url_id
+            claimed_urls.add(job.url_id)
+            self.push(job)
+        await release_jobs(duplicates)
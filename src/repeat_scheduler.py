@@ -0,0 +1,131 @@
+import asyncio
+import datetime
+import heapq
+import time
+from traceback import print_exc
+from typing import Iterable
+
+from sqlalchemy import select
+
+from .models import RepeatURL
+
+
+class RepeatScheduler:
+    """When each active repeat URL is due next, in a min-heap of ``(next_due, repeat_id)``.
+
+    :meth:`run` sleeps until the earliest deadline, queues every URL that is due by
+    then in one go and schedules them again for their next capture. Loops that
+    cannot be queued yet (another job for the URL is still pending) are checked again
+    after ``recheck_interval`` seconds. :meth:`schedule` is called when a loop is
+    created or changed, and the heap is reloaded from ``RepeatURL.next_due_at`` every
+    ``resync_interval`` seconds to pick up changes made by other processes.
+    """
+
+    def __init__(self, resync_interval: float, recheck_interval: float):
+        self.resync_interval = resync_interval
+        self.recheck_interval = datetime.timedelta(seconds=recheck_interval)
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        # Repeat ID -> its deadline, heap entries with another deadline are outdated
+        self._deadlines: dict[int, datetime.datetime] = {}
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, repeat_id: int, next_due: datetime.datetime):
+        if next_due.tzinfo is None:  # SQLite does not store time zones
+            next_due = next_due.replace(tzinfo=datetime.timezone.utc)
+        self._deadlines[repeat_id] = next_due
+        heapq.heappush(self._heap, (next_due, repeat_id))
+        self._changed.set()
+
+    def next_due(self) -> datetime.datetime | None:
+        while self._heap:
+            next_due, repeat_id = self._heap[0]
+            if self._deadlines.get(repeat_id) == next_due:
+                return next_due
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, curtime: datetime.datetime) -> list[int]:
+        """Remove and return every repeat ID that is due at ``curtime``."""
+        due = []
+        while (next_due := self.next_due()) is not None and next_due <= curtime:
+            _, repeat_id = heapq.heappop(self._heap)
+            del self._deadlines[repeat_id]
+            due.append(repeat_id)
+        return due
+
+    async def resync(self):
+        """Replace the schedule with the deadlines of every active loop in the database."""
+        from .main import async_session
+
+        async with async_session() as session:
+            result = await session.execute(
+                select(RepeatURL.id, RepeatURL.next_due_at).where(
+                    RepeatURL.active_since != None
+                )
+            )
+            rows = result.all()
+        self._heap.clear()
+        self._deadlines.clear()
+        for repeat_id, next_due in rows:
+            self.schedule(repeat_id, next_due)
+
+    def _reschedule(
+        self,
+        repeat_ids: Iterable[int],
+        next_due: dict[int, datetime.datetime],
+        curtime: datetime.datetime,
+    ):
+        for repeat_id in repeat_ids:
+            if repeat_id in self._deadlines:
+                continue  # Changed while it was being queued
+            self.schedule(
+                repeat_id, next_due.get(repeat_id, curtime + self.recheck_interval)
+            )
+
+    async def run(self):
+        from .main import queue_due_repeat_urls
+
+        resynced_at: float | None = None
+        while True:
+            # Cleared before looking for due URLs, so that a loop changed in the
+            # meantime is picked up right away
+            self._changed.clear()
+            if (
+                resynced_at is None
+                or time.monotonic() - resynced_at >= self.resync_interval
+            ):
+                try:
+                    await self.resync()
+                except Exception:
+                    print("Failed to reload the repeat URL schedule, retrying:")
+                    print_exc()
+                    await asyncio.sleep(self.recheck_interval.total_seconds())
+                    continue
+                self._changed.clear()
+                resynced_at = time.monotonic()
+            curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+            if due := self.pop_due(curtime):
+                try:
+                    next_due = await queue_due_repeat_urls(due, curtime)
+                except Exception:
+                    # Tried again after recheck_interval, like loops that cannot be
+                    # queued yet
+                    print("Failed to queue due repeat URLs, retrying later:")
+                    print_exc()
+                    self._reschedule(due, {}, curtime)
+                    continue
+                except BaseException:
+                    self._reschedule(due, {}, curtime)
+                    raise
+                self._reschedule(due, next_due, curtime)
+                continue
+            timeout = self.resync_interval - (time.monotonic() - resynced_at)
+            if (next_due := self.next_due()) is not None:
+                timeout = min(timeout, (next_due - curtime).total_seconds())
+            try:
+                await asyncio.wait_for(self._changed.wait(), max(0, timeout))
+            except TimeoutError:
+                pass
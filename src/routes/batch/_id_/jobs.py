@@ -6,11 +6,12 @@ from ....models import Job, Batch
 
 from ....main import (
     JobPaginationQueryArgs,
-    PaginationInfo,
     PaginationOutput,
     apply_job_filtering,
     async_session,
     app,
+    next_cursor,
+    pagination_info,
 )
 from ...job.shared_models import JobReturn
 
@@ -31,7 +32,6 @@ async def get_batch_jobs(
             .join(Batch.jobs)
             .where(Batch.id == batch_id)
         )
-        job_count = await session.scalar(stmt)
         stmt2 = (
             apply_job_filtering(query_params, False)
             .join(Batch.jobs)
@@ -39,11 +39,9 @@ async def get_batch_jobs(
             .options(sqlalchemy.orm.joinedload(Job.batches))
         )
         result = await session.scalars(stmt2)
+        jobs = result.unique().all()
         return PaginationOutput(
-            data=[JobReturn.from_job(job) for job in result.unique().all()],
-            pagination=PaginationInfo(
-                current_page=query_params["page"],
-                total_pages=job_count // 100 + 1,
-                items=job_count,
-            ),
+            data=[JobReturn.from_job(job) for job in jobs],
+            pagination=await pagination_info(session, stmt, query_params),
+            next_cursor=next_cursor(query_params, jobs, Job.id),
         )
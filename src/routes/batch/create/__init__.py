@@ -1,12 +1,17 @@
 import datetime
 from itertools import batched
-from typing import Iterable
-from pydantic import BaseModel, Field, model_validator
-from sqlalchemy import select
+from typing import AsyncIterable, BinaryIO, Iterable, Iterator, Sequence, TextIO
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.routes.queue.batch import QueueBatchReturn
-from ....models import Job, URL, Batch, BatchTag
-from ....main import app, async_session
+from ...ingest import IngestTaskAccepted, accepted
+from .... import metrics
+from ....ingest import insert_jobs, upsert_urls
+from ....ingest_tasks import IngestKind, RowError
+from ....models import URL, Batch, BatchTag
+from ....main import app, async_session, ingest_tasks, stats_counters
 
 
 class BatchItem(BaseModel):
@@ -21,6 +26,7 @@ class BatchItem(BaseModel):
             raise ValueError("Batch item cannot be both completed and failed")
         if not self.completed and not self.failed:
             raise ValueError("Batch item must be either completed or failed")
+        return self
 
     @property
     def effective_creation_time(self) -> datetime.datetime:
@@ -38,50 +44,140 @@ async def add_filled_batch(
     priority: int = 0,
     tags: Iterable[str],
 ) -> QueueBatchReturn:
-    items_batched = batched(items, 30000)
     job_count = 0
     async with async_session() as session, session.begin():
         batch = Batch(tags=await BatchTag.resolve_list(set(tags)))
-        for item_set in items_batched:
-            urls = [item.url for item in item_set]
-            stmt = select(URL).where(URL.url.in_(urls))
-            result = await session.scalars(stmt)
-            existing_urls_items = result.all()
-            existing_urls = {url.url for url in existing_urls_items}
-            new_urls = set(urls) - set(existing_urls)
-            if new_urls:
-                new_url_models = [URL(url=url) for url in new_urls]
-                session.add_all(new_url_models)
-                del new_urls, new_url_models, existing_urls, existing_urls_items
-                # Needed because bulk create doesn't return the created models with their IDs
-                stmt = select(URL).where(URL.url.in_(urls))
-                result = await session.scalars(stmt)
-                url_models = result.all()
-            else:
-                url_models = existing_urls_items
-                del new_urls, existing_urls, existing_urls_items
-            url_map: dict[str, URL] = {url.url: url for url in url_models}
-            del url_models
-            jobs = []
-            for item in item_set:
-                job = Job(
-                    url=url_map[item.url],
-                    batches=[batch],
-                    priority=priority,
-                    completed=item.completed,
-                    failed=item.failed,
-                )
-                job.created_at = item.effective_creation_time
-                jobs.append(job)
-                url_map[item.url].last_seen = (
-                    item.completed or url_map[item.url].last_seen
-                )
-            session.add_all(jobs)
-            job_count += len(jobs)
+        session.add(batch)
+        await session.flush()
+        stats_counters.changes(session).batches += 1
+        for item_set in batched(items, 30000):
+            await add_filled_items(session, batch.id, item_set, priority=priority)
+            job_count += len(item_set)
+    metrics.jobs_created_total.inc(job_count, source="import")
 
     return QueueBatchReturn(batch_id=batch.id, job_count=job_count)
 
 
-@app.post("/batch/create")
-async def create_batch(body: CreateBatchBody, priority: int = 0) -> QueueBatchReturn:
+async def add_filled_batch_chunks(
+    chunks: AsyncIterable[Sequence[BatchItem]],
+    *,
+    priority: int = 0,
+    tags: Iterable[str],
+) -> QueueBatchReturn:
+    """Like :func:`add_filled_batch`, but commits every chunk of items in its own transaction."""
+    async with async_session() as session, session.begin():
+        batch = Batch(tags=await BatchTag.resolve_list(set(tags)))
+        session.add(batch)
+        stats_counters.changes(session).batches += 1
+    job_count = 0
+    async for items in chunks:
+        async with async_session() as session, session.begin():
+            await add_filled_items(session, batch.id, items, priority=priority)
+        metrics.jobs_created_total.inc(len(items), source="import")
+        job_count += len(items)
+
+    return QueueBatchReturn(batch_id=batch.id, job_count=job_count)
+
+
+async def add_filled_items(
+    session: AsyncSession,
+    batch_id: int,
+    items: Sequence[BatchItem],
+    *,
+    priority: int,
+) -> int:
+    """Add a chunk of finished jobs to a batch, returns how many of them completed."""
+    url_ids = await upsert_urls(session, (item.url for item in items))
+    await insert_jobs(
+        session,
+        batch_id,
+        [
+            {
+                "url_id": url_ids[item.url],
+                "priority": priority,
+                "completed": item.completed,
+                "failed": item.failed,
+                "created_at": item.effective_creation_time,
+            }
+            for item in items
+        ],
+    )
+    # The last capture of each URL in the file wins, like it would in order
+    last_seen = {
+        url_ids[item.url]: item.completed
+        for item in items
+        if item.completed is not None
+    }
+    if last_seen:
+        changes = stats_counters.changes(session)
+        result = await session.execute(
+            select(URL.id, URL.last_seen).where(URL.id.in_(list(last_seen)))
+        )
+        for url_id, previous in result.tuples().all():
+            changes.url_archived(previous, last_seen[url_id])
+        await session.execute(
+            update(URL),
+            [
+                {"id": url_id, "last_seen": completed}
+                for url_id, completed in last_seen.items()
+            ],
+        )
+    return sum(item.completed is not None for item in items)
+
+
+def parse_batch_item_line(line: str) -> BatchItem | RowError | None:
+    """Parse a line of newline-delimited JSON, None if it is blank."""
+    if not line.strip():
+        return None
+    try:
+        return BatchItem.model_validate_json(line)
+    except ValidationError as e:
+        return RowError(
+            "; ".join(
+                ".".join(map(str, error["loc"])) + ": " + error["msg"]
+                if error["loc"]
+                else error["msg"]
+                for error in e.errors()
+            )
+        )
+
+
+def read_batch_item_lines(
+    file: TextIO, options: dict
+) -> Iterator[BatchItem | RowError | None]:
+    # One row per line, blank ones included, so that row numbers are line numbers
+    for line in file:
+        yield parse_batch_item_line(line)
+
+
+async def ingest_batch_items(
+    session: AsyncSession, batch_id: int, items: list[BatchItem], options: dict
+) -> dict[str, int]:
+    completed = await add_filled_items(
+        session, batch_id, items, priority=options["priority"]
+    )
+    return {"completed": completed, "failed": len(items) - completed}
+
+
+# A JSON batch item per line, from /batch/create and /batch/create/ndjson
+ingest_tasks.register(
+    "batch_items",
+    IngestKind(read_batch_item_lines, ingest_batch_items, source="import"),
+)
+
+
+@app.post("/batch/create", responses={202: {"model": IngestTaskAccepted}})
+async def create_batch(
+    body: CreateBatchBody, priority: int = 0, background: bool = False
+) -> QueueBatchReturn:
+    if background:
+
+        def write(file: BinaryIO):
+            for item in body.items:
+                file.write(item.model_dump_json().encode() + b"\n")
+
+        task_id = await ingest_tasks.submit(
+            "batch_items", {"priority": priority, "tags": body.tags}, write
+        )
+        return accepted(task_id)
     return await add_filled_batch(body.items, priority=priority, tags=body.tags)
@@ -0,0 +1,63 @@
+from typing import Annotated
+from fastapi import Query, Request
+
+from . import add_filled_batch_chunks, parse_batch_item_line
+from ...ingest import IngestRowError, IngestTaskAccepted, accepted
+from ...queue.batch import QueueBatchReturn
+from ....ingest import async_batched, stream_lines
+from ....ingest_tasks import RowError
+from ....main import app, ingest_chunk_size, ingest_tasks
+
+
+class CreateBatchNDJSONReturn(QueueBatchReturn):
+    error_count: int
+    errors: list[IngestRowError]  # The first ones only
+
+
+@app.post(
+    "/batch/create/ndjson",
+    responses={202: {"model": IngestTaskAccepted}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/BatchItem"}
+                }
+            },
+        }
+    },
+)
+async def create_batch_ndjson(
+    request: Request,
+    priority: int = 0,
+    tags: Annotated[list[str], Query()] = [],
+    background: bool = False,
+) -> CreateBatchNDJSONReturn:
+    if background:
+        task_id = await ingest_tasks.submit(
+            "batch_items", {"priority": priority, "tags": tags}, request.stream()
+        )
+        return accepted(task_id)
+    errors: list[IngestRowError] = []
+    error_count = 0
+
+    async def items():
+        nonlocal error_count
+        line_number = 0
+        async for line in stream_lines(request.stream()):
+            line_number += 1
+            item = parse_batch_item_line(line)
+            if isinstance(item, RowError):
+                error_count += 1
+                if len(errors) < ingest_tasks.max_errors:
+                    errors.append(IngestRowError(row=line_number, error=item.error))
+            elif item is not None:
+                yield item
+
+    result = await add_filled_batch_chunks(
+        async_batched(items(), ingest_chunk_size), priority=priority, tags=tags
+    )
+    return CreateBatchNDJSONReturn(
+        **result.model_dump(), error_count=error_count, errors=errors
+    )
@@ -0,0 +1,73 @@
+import datetime
+from typing import Literal
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from ...models import IngestTask
+
+
+class IngestTaskAccepted(BaseModel):
+    task_id: int
+
+
+def accepted(task_id: int) -> JSONResponse:
+    """The response of an endpoint that left its payload to an ingest task."""
+    return JSONResponse(
+        IngestTaskAccepted(task_id=task_id).model_dump(),
+        status_code=202,
+        headers={"Location": f"/ingest/{task_id}"},
+    )
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # SQLite does not store time zones
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+class IngestRowError(BaseModel):
+    row: int
+    error: str
+
+
+class IngestTaskReturn(BaseModel):
+    id: int
+    kind: str
+    status: Literal["queued", "running", "completed", "failed"]
+    created_at: datetime.datetime
+    started_at: datetime.datetime | None
+    finished_at: datetime.datetime | None
+    rows_processed: int
+    rows_per_second: float | None
+    error_count: int
+    errors: list[IngestRowError]  # The first ones only
+    error: str | None
+    batch_id: int | None
+
+    @classmethod
+    def from_task(cls, task: IngestTask) -> "IngestTaskReturn":
+        if task.finished_at is not None:
+            status = "failed" if task.error is not None else "completed"
+        else:
+            status = "running" if task.started_at is not None else "queued"
+        rows_per_second = None
+        if task.started_at is not None:
+            end = task.finished_at or datetime.datetime.now(tz=datetime.timezone.utc)
+            seconds = (_as_utc(end) - _as_utc(task.started_at)).total_seconds()
+            if seconds > 0:
+                rows_per_second = task.rows_processed / seconds
+        return cls(
+            id=task.id,
+            kind=task.kind,
+            status=status,
+            created_at=task.created_at,
+            started_at=task.started_at,
+            finished_at=task.finished_at,
+            rows_processed=task.rows_processed,
+            rows_per_second=rows_per_second,
+            error_count=task.error_count,
+            errors=task.errors,
+            error=task.error,
+            batch_id=task.batch_id,
+        )
@@ -0,0 +1,25 @@
+from typing import Annotated
+from fastapi import HTTPException, Path
+
+from . import IngestTaskReturn
+from ...models import IngestTask
+
+from ...main import async_session, app
+
+
+@app.get("/ingest/{task_id}")
+async def get_ingest_task(
+    task_id: Annotated[
+        int,
+        Path(
+            title="Task ID",
+            description="The ID of the ingest task you want the progress of",
+            ge=1,
+        ),
+    ],
+) -> IngestTaskReturn:
+    async with async_session() as session, session.begin():
+        task = await session.get(IngestTask, task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Ingest task not found")
+        return IngestTaskReturn.from_task(task)
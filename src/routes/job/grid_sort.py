@@ -1,5 +1,5 @@
 from typing import Iterable
-from ...main import app, async_session
+from ...main import Count, app, async_session, row_counter
 from ...models import URL, Batch, Job
 from sqlalchemy import select
 import sqlalchemy.orm
@@ -13,9 +13,15 @@ sort_map = {"url": URL.url}
 
 @app.post("/job/grid_sort")
 async def get_job_grid_sort(
-    request: IServerSideGetRowsRequest, batch_id: int | None = None
+    request: IServerSideGetRowsRequest,
+    batch_id: int | None = None,
+    count: Count = "exact",
 ) -> LoadSuccessParams[JobReturn]:
-    """Get job grid sort."""
+    """Get job grid sort.
+
+    rowCount is null when the count is ``none``, so that the grid keeps scrolling
+    until a block comes back short.
+    """
 
     selected = [Job]
     offset = request.startRow
@@ -40,9 +46,9 @@ async def get_job_grid_sort(
     async with async_session() as session, session.begin():
         data: Iterable[Job] = await session.scalars(query)
         result = [JobReturn.from_job(row) for row in data.unique()]
-        count = await session.scalar(count_query)
+        row_count, _ = await row_counter.count(session, count_query, count)
 
     return LoadSuccessParams[JobReturn](
         rowData=result,
-        rowCount=count,
+        rowCount=row_count,
     )
@@ -13,6 +13,7 @@ class JobReturn(BaseModel):
     delayed_until: datetime.datetime | None
     priority: int
     retry: int
+    attempts: int
     failed: datetime.datetime | None
     batches: list[int] = []
 
@@ -32,6 +33,7 @@ class JobReturn(BaseModel):
             delayed_until=job.delayed_until,
             priority=job.priority,
             retry=job.retry,
+            attempts=job.attempts,
             failed=job.failed,
             batches=batch_ids
             if batch_ids != None
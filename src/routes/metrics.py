@@ -0,0 +1,9 @@
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+from ..main import app
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,9 +1,19 @@
 from itertools import batched
-from typing import Iterable
+from typing import AsyncIterable, BinaryIO, Iterable, Iterator, Sequence, TextIO
 from pydantic import BaseModel, Field
-from sqlalchemy import select
-from ....models import BatchTag, Job, URL, Batch
-from ....main import app, async_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from .... import metrics
+from ....ingest import insert_jobs, upsert_urls, url_ids_in_batch
+from ....ingest_tasks import IngestKind
+from ....models import BatchTag, Batch
+from ....main import (
+    app,
+    async_session,
+    ingest_tasks,
+    notify_jobs_queued,
+    stats_counters,
+)
+from ...ingest import IngestTaskAccepted, accepted
 
 
 class QueueBatchBody(BaseModel):
@@ -22,42 +32,124 @@ async def add_batch(
     priority: int = 0,
     tags: list[str],
 ) -> QueueBatchReturn:
-    urls_batched = batched(urls, 30000)
     job_count = 0
     async with async_session() as session, session.begin():
-        for urls_set in urls_batched:
-            batch = Batch(tags=await BatchTag.resolve_list(set(tags)))
-            stmt = select(URL).where(URL.url.in_(urls))
-            result = await session.scalars(stmt)
-            existing_urls_items = result.all()
-            existing_urls = {url.url for url in existing_urls_items}
-            new_urls = set(urls_batched) - set(existing_urls)
-            if new_urls:
-                new_url_models = [URL(url=url) for url in new_urls]
-                session.add_all(new_url_models)
-                del new_urls, new_url_models, existing_urls, existing_urls_items
-                # Needed because bulk create doesn't return the created models with their IDs
-                stmt = select(URL).where(URL.url.in_(urls_batched))
-                result = await session.scalars(stmt)
-                url_models = result.all()
-            else:
-                url_models = existing_urls_items
-                del new_urls, existing_urls, existing_urls_items
-            url_map = {url.url: url for url in url_models}
-            del url_models
-            jobs = []
-            for url in urls_batched:
-                jobs.append(Job(url=url_map[url], batches=[batch], priority=priority))
-            session.add_all(jobs)
-            job_count += len(jobs)
+        batch = Batch(tags=await BatchTag.resolve_list(set(tags)))
+        session.add(batch)
+        await session.flush()
+        stats_counters.changes(session).batches += 1
+        for urls_set in batched(urls, 30000):
+            url_ids = await upsert_urls(session, urls_set)
+            await insert_jobs(
+                session,
+                batch.id,
+                [{"url_id": url_ids[url], "priority": priority} for url in urls_set],
+            )
+            job_count += len(urls_set)
+        await notify_jobs_queued(session, priority)
+    metrics.jobs_created_total.inc(job_count, source="batch")
 
     return QueueBatchReturn(batch_id=batch.id, job_count=job_count)
 
 
-@app.post("/queue/batch")
+async def add_batch_chunks(
+    chunks: AsyncIterable[Sequence[str]],
+    *,
+    priority: int = 0,
+    tags: list[str],
+    unique_only: bool = False,
+) -> QueueBatchReturn:
+    """Like :func:`add_batch`, but commits every chunk of URLs in its own transaction.
+
+    Memory use and the time locks are held for depend on the chunk size only, not on
+    the number of URLs. The jobs of each chunk can be picked up by the workers as soon
+    as it is committed. With ``unique_only``, URLs that already have a job in the
+    batch are skipped.
+    """
+    async with async_session() as session, session.begin():
+        batch = Batch(tags=await BatchTag.resolve_list(set(tags)))
+        session.add(batch)
+        stats_counters.changes(session).batches += 1
+    job_count = 0
+    async for urls in chunks:
+        async with async_session() as session, session.begin():
+            queued = await queue_urls(
+                session, batch.id, urls, priority=priority, unique_only=unique_only
+            )
+        metrics.jobs_created_total.inc(queued, source="batch")
+        job_count += queued
+
+    return QueueBatchReturn(batch_id=batch.id, job_count=job_count)
+
+
+async def queue_urls(
+    session: AsyncSession,
+    batch_id: int,
+    urls: Sequence[str],
+    *,
+    priority: int,
+    unique_only: bool,
+) -> int:
+    """Queue a chunk of URLs in a batch, returns the number of queued jobs."""
+    url_ids = await upsert_urls(session, urls)
+    if unique_only:
+        queued = await url_ids_in_batch(session, batch_id, url_ids.values())
+        new_url_ids = [url_id for url_id in url_ids.values() if url_id not in queued]
+    else:
+        new_url_ids = [url_ids[url] for url in urls]
+    await insert_jobs(
+        session,
+        batch_id,
+        [{"url_id": url_id, "priority": priority} for url_id in new_url_ids],
+    )
+    if new_url_ids:
+        await notify_jobs_queued(session, priority)
+    return len(new_url_ids)
+
+
+def read_url_lines(file: TextIO, options: dict) -> Iterator[str]:
+    for line in file:
+        if line := line.rstrip("\r\n"):
+            yield line
+
+
+async def ingest_urls(
+    session: AsyncSession, batch_id: int, urls: list[str], options: dict
+) -> dict[str, int]:
+    queued = await queue_urls(
+        session,
+        batch_id,
+        urls,
+        priority=options["priority"],
+        unique_only=options["unique_only"],
+    )
+    return {"pending": queued}
+
+
+# A URL per line, from /queue/batch and /queue/batch/file
+ingest_tasks.register("urls", IngestKind(read_url_lines, ingest_urls, source="batch"))
+
+
+@app.post("/queue/batch", responses={202: {"model": IngestTaskAccepted}})
 async def queue_batch(
-    body: QueueBatchBody, priority: int = 0, unique_only: bool = True
+    body: QueueBatchBody,
+    priority: int = 0,
+    unique_only: bool = True,
+    background: bool = False,
 ) -> QueueBatchReturn:
+    if background:
+        urls = dict.fromkeys(body.urls) if unique_only else body.urls
+
+        def write(file: BinaryIO):
+            for url in urls:
+                file.write(f"{url}\n".encode())
+
+        task_id = await ingest_tasks.submit(
+            "urls",
+            {"priority": priority, "unique_only": unique_only, "tags": body.tags},
+            write,
+        )
+        return accepted(task_id)
     return await add_batch(
-        set(body.urls) if unique_only else body.urls, priority, unique_only
+        set(body.urls) if unique_only else body.urls, priority=priority, tags=body.tags
     )
@@ -1,22 +1,35 @@
-from fastapi import UploadFile
-from pydantic import BaseModel, Field
+import shutil
+from typing import Annotated, BinaryIO
+from fastapi import Form, UploadFile
 
-from . import QueueBatchReturn, add_batch
-from ....main import app
+from . import QueueBatchReturn, add_batch_chunks
+from ...ingest import IngestTaskAccepted, accepted
+from ....ingest import async_batched, upload_lines
+from ....main import app, ingest_chunk_size, ingest_tasks
 
 
-class QueueBatchFileBody(BaseModel):
-    file: UploadFile
-    tags: list[str] = Field(default_factory=list)
-
-
-@app.post("/queue/batch/file")
+@app.post("/queue/batch/file", responses={202: {"model": IngestTaskAccepted}})
 async def queue_batch_file(
-    body: QueueBatchFileBody,
+    file: UploadFile,
+    tags: Annotated[list[str], Form()] = [],
     priority: int = 0,
     unique_only: bool = False,
+    background: bool = False,
 ) -> QueueBatchReturn:
-    urls = (await body.file.read()).decode().splitlines(False)
-    return await add_batch(
-        set(urls) if unique_only else urls, priority, unique_only, tags=body.tags
+    if background:
+
+        def write(spool_file: BinaryIO):
+            shutil.copyfileobj(file.file, spool_file)
+
+        task_id = await ingest_tasks.submit(
+            "urls",
+            {"priority": priority, "unique_only": unique_only, "tags": tags},
+            write,
+        )
+        return accepted(task_id)
+    return await add_batch_chunks(
+        async_batched(upload_lines(file), ingest_chunk_size),
+        priority=priority,
+        tags=tags,
+        unique_only=unique_only,
     )
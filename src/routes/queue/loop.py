@@ -2,7 +2,7 @@ import datetime
 from pydantic import BaseModel
 from sqlalchemy import select
 from ...models import URL, Batch, RepeatURL
-from ...main import app, async_session
+from ...main import app, async_session, repeat_scheduler, stats_counters
 
 
 class QueueRepeatURLBody(BaseModel):
@@ -16,7 +16,9 @@ class QueueLoopReturn(BaseModel):
 
 @app.post("/queue/loop")
 async def queue_loop(body: QueueRepeatURLBody) -> QueueLoopReturn:
+    curtime = datetime.datetime.now(tz=datetime.timezone.utc)
     async with async_session() as session, session.begin():
+        changes = stats_counters.changes(session)
         stmt = select(RepeatURL).join(RepeatURL.url).where(URL.url == body.url)
         result = await session.scalars(stmt)
         repeat = result.first()
@@ -27,10 +29,20 @@ async def queue_loop(body: QueueRepeatURLBody) -> QueueLoopReturn:
             if url is None:
                 url = URL(url=body.url)
                 session.add(url)
+                changes.urls += 1
             batch = Batch()
             repeat = RepeatURL(url=url, interval=body.interval, batch=batch)
+            repeat.next_due_at = curtime
             session.add(repeat)
+            changes.batches += 1
+            changes.repeat_urls[True] += 1
         else:
             repeat.interval = body.interval
-            repeat.active_since = datetime.datetime.now(tz=datetime.timezone.utc)
+            if repeat.active_since is None:
+                changes.repeat_urls[False] -= 1
+                changes.repeat_urls[True] += 1
+            repeat.active_since = curtime
+            # Checked again right away, the new interval applies from the last capture
+            repeat.next_due_at = curtime
+    repeat_scheduler.schedule(repeat.id, curtime)
     return QueueLoopReturn(repeat_id=repeat.id)
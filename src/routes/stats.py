@@ -1,9 +1,14 @@
 import datetime
 from pydantic import BaseModel
-import sqlalchemy
-from sqlalchemy import select
-from ..models import Job, URL, Batch, RepeatURL
-from ..main import app, async_session, min_wait_time_between_archives
+from ..main import (
+    app,
+    archive_rate_limiter,
+    archive_transport,
+    min_wait_time_between_archives,
+    stats_counters,
+)
+from ..ratelimit import RateLimiterState
+from ..transport import TransportState
 
 
 class RetryCount(BaseModel):
@@ -42,90 +47,32 @@ class Stats(BaseModel):
     batches: int
     urls: URLStats
     repeat_urls: StatsRepeatURL
+    # When the counts were last recounted from the database. Changes made by this
+    # process since are included, changes made by other processes are not.
+    counted_at: datetime.datetime | None
 
 
 @app.get("/stats")
 async def stats() -> Stats:
-    async with async_session() as session, session.begin():
-        not_done = dict(
-            (
-                await session.execute(
-                    select(Job.retry, sqlalchemy.func.count(Job.id))
-                    .where((Job.completed == None) & (Job.failed == None))
-                    .group_by(Job.retry)
-                )
-            ).all()
-        )
-        completed = dict(
-            (
-                await session.execute(
-                    select(Job.retry, sqlalchemy.func.count(Job.id))
-                    .where(Job.completed != None)
-                    .group_by(Job.retry)
-                )
-            ).all()
-        )
-        failed = (
-            await session.scalar(
-                select(sqlalchemy.func.count(Job.id)).where(Job.failed != None)
-            )
-        ) or 0
-        batches = (await session.scalar(select(sqlalchemy.func.count(Batch.id)))) or 0
-        super_recently_archived_urls = (
-            await session.scalar(
-                select(sqlalchemy.func.count(URL.id))
-                .where(URL.last_seen != None)
-                .where(
-                    URL.last_seen
-                    > datetime.datetime.now(tz=datetime.timezone.utc)
-                    - min_wait_time_between_archives
-                )
-            )
-        ) or 0
-        recently_archived_urls = (
-            (
-                await session.scalar(
-                    select(sqlalchemy.func.count(URL.id))
-                    .where(URL.last_seen != None)
-                    .where(
-                        URL.last_seen
-                        > datetime.datetime.now(tz=datetime.timezone.utc)
-                        - datetime.timedelta(hours=4)
-                    )
-                )
-            )
-            or 0
-        ) - super_recently_archived_urls
-        not_recently_archived_urls = (
-            await session.scalar(
-                select(sqlalchemy.func.count(URL.id))
-                .where(URL.last_seen != None)
-                .where(
-                    URL.last_seen
-                    < datetime.datetime.now(tz=datetime.timezone.utc)
-                    - datetime.timedelta(hours=4)
-                )
-            )
-        ) or 0
-        not_archived_urls = (
-            await session.scalar(
-                select(sqlalchemy.func.count(URL.id)).where(URL.last_seen == None)
-            )
-        ) or 0
-        active_repeat_urls = (
-            await session.scalar(
-                select(sqlalchemy.func.count(RepeatURL.id)).where(
-                    RepeatURL.active_since != None
-                )
-            )
-        ) or 0
-        inactive_repeat_urls = (
-            await session.scalar(
-                select(sqlalchemy.func.count(RepeatURL.id)).where(
-                    RepeatURL.active_since == None
-                )
-            )
-        ) or 0
+    curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+    not_done = stats_counters.job_counts("pending")
+    completed = stats_counters.job_counts("completed")
+    failed = sum(stats_counters.job_counts("failed").values())
+    super_recently_archived_urls = stats_counters.archived_since(
+        curtime - min_wait_time_between_archives
+    )
+    recently_archived_urls = (
+        stats_counters.archived_since(curtime - datetime.timedelta(hours=4))
+        - super_recently_archived_urls
+    )
+    not_recently_archived_urls = (
+        stats_counters.archived_urls
+        - super_recently_archived_urls
+        - recently_archived_urls
+    )
+    not_archived_urls = stats_counters.urls - stats_counters.archived_urls
+    active_repeat_urls = stats_counters.repeat_urls[True]
+    inactive_repeat_urls = stats_counters.repeat_urls[False]
 
     return Stats(
         jobs=StatsJob(
@@ -148,7 +95,7 @@ async def stats() -> Stats:
             failed=failed,
             total=sum(not_done.values()) + sum(completed.values()) + failed,
         ),
-        batches=batches,
+        batches=stats_counters.batches,
         urls=URLStats(
             super_recently_archived=super_recently_archived_urls,
             recently_archived=recently_archived_urls,
@@ -167,4 +114,15 @@ async def stats() -> Stats:
             inactive=inactive_repeat_urls,
             total=active_repeat_urls + inactive_repeat_urls,
         ),
+        counted_at=stats_counters.reconciled_at,
     )
+
+
+@app.get("/stats/limiter")
+async def limiter_stats() -> RateLimiterState:
+    return archive_rate_limiter.state()
+
+
+@app.get("/stats/transport")
+async def transport_stats() -> TransportState:
+    return archive_transport.state()
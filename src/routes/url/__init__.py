@@ -3,7 +3,9 @@ from ...main import (
     PaginationQueryArgs,
     PaginationOutput,
     async_session,
-    PaginationInfo,
+    next_cursor,
+    paginate,
+    pagination_info,
 )
 from ...models import URL
 import sqlalchemy
@@ -15,25 +17,17 @@ async def get_urls(
     query_params: PaginationQueryArgs, unique: bool = True
 ) -> PaginationOutput[URL]:
     after = query_params["after"]
-    page = query_params["page"]
-    desc = query_params["desc"]
     async with async_session() as session, session.begin():
         stmt = select(sqlalchemy.func.count(URL.id))
         if after:
             stmt = stmt.where(URL.first_seen > after)
-        url_count = await session.scalar(stmt)
-        stmt2 = (
-            select(URL)
-            .order_by(URL.id.desc() if desc else URL.id.asc())
-            .offset((page - 1) * 100)
-            .limit(100)
-        )
+        stmt2 = paginate(select(URL), query_params, URL.id)
         if after:
             stmt2 = stmt2.where(URL.first_seen > after)
         result = await session.scalars(stmt2)
+        urls = result.unique().all()
         return PaginationOutput(
-            data=result.unique().all(),
-            pagination=PaginationInfo(
-                current_page=page, total_pages=url_count // 100 + 1, items=url_count
-            ),
+            data=urls,
+            pagination=await pagination_info(session, stmt, query_params),
+            next_cursor=next_cursor(query_params, urls, URL.id),
         )
@@ -0,0 +1,325 @@
+import asyncio
+import collections
+import datetime
+import re
+from traceback import print_exc
+from typing import Iterable, Literal
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+from sqlalchemy import select
+
+from .models import URL, Batch, Job, RepeatURL
+
+JobState = Literal["pending", "completed", "failed"]
+
+
+def job_state(
+    completed: datetime.datetime | None, failed: datetime.datetime | None
+) -> JobState:
+    if completed is not None:
+        return "completed"
+    if failed is not None:
+        return "failed"
+    return "pending"
+
+
+def _to_second(timestamp: datetime.datetime) -> datetime.datetime:
+    if timestamp.tzinfo is None:
+        # SQLite does not store time zones
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def _in_snapshot(transaction_id: int | None, snapshot: str | None) -> bool:
+    """Whether a committed transaction is visible in a Postgres ``pg_snapshot``."""
+    if transaction_id is None or snapshot is None:
+        # Committed before the snapshot was taken
+        return True
+    xmin, xmax, xip = re.fullmatch(r"(\d+):(\d+):([\d,]*)", snapshot).groups()
+    if transaction_id < int(xmin):
+        return True
+    return transaction_id < int(xmax) and str(transaction_id) not in xip.split(",")
+
+
+class StatsDelta:
+    """Changes to the counts made by one transaction, applied once it commits."""
+
+    def __init__(self):
+        # (state, retry) -> jobs
+        self.jobs: collections.Counter[tuple[JobState, int]] = collections.Counter()
+        self.batches = 0
+        self.urls = 0
+        self.archived_urls = 0
+        # URL.last_seen (to the second) -> URLs
+        self.archive_times: collections.Counter[datetime.datetime]
+        self.archive_times = collections.Counter()
+        # Whether active -> repeat URLs
+        self.repeat_urls: collections.Counter[bool] = collections.Counter()
+        # The Postgres transaction ID, only looked up while a reconcile is counting
+        self.transaction_id: int | None = None
+
+    def jobs_created(self, jobs: Iterable[dict]):
+        """Count new jobs, given as ``Job`` column values."""
+        for job in jobs:
+            state = job_state(job.get("completed"), job.get("failed"))
+            self.jobs[state, job.get("retry", 0)] += 1
+
+    def job_moved(self, old: tuple[JobState, int], new: tuple[JobState, int]):
+        if old != new:
+            self.jobs[old] -= 1
+            self.jobs[new] += 1
+
+    def url_archived(
+        self, old: datetime.datetime | None, new: datetime.datetime | None
+    ):
+        """Count a change of ``URL.last_seen``."""
+        if old is not None:
+            self.archived_urls -= 1
+            self.archive_times[_to_second(old)] -= 1
+        if new is not None:
+            self.archived_urls += 1
+            self.archive_times[_to_second(new)] += 1
+
+
+class StatsCounters:
+    """The counts behind ``/stats``, kept in memory so that it never scans a table.
+
+    Transactions record what they change in :meth:`changes`, which is added to the
+    counts once they commit. Every ``reconcile_interval`` seconds (and at startup)
+    :meth:`reconcile` counts everything in the database again, which picks up the
+    changes made by other processes sharing the database and corrects any drift.
+
+    A reconcile reads every count from one snapshot of the database, and changes
+    committed by this process after the snapshot was taken are added on top of its
+    counts again. On Postgres those are told apart by their transaction IDs, which
+    are looked up while committing only when a reconcile is running. SQLite holds
+    the write lock while counting instead, so nothing commits after the snapshot.
+
+    Archived URLs are split by how recently they were archived, which changes as time
+    passes without any writes. The counts of ``URL.last_seen`` values within the last
+    ``recent_window`` are kept per second for that, everything older is only counted
+    in total.
+    """
+
+    def __init__(self, reconcile_interval: float, recent_window: datetime.timedelta):
+        self.reconcile_interval = reconcile_interval
+        self.recent_window = recent_window
+        self.jobs: collections.Counter[tuple[JobState, int]] = collections.Counter()
+        self.batches = 0
+        self.urls = 0
+        self.archived_urls = 0
+        self.archive_times: collections.Counter[datetime.datetime]
+        self.archive_times = collections.Counter()
+        self.repeat_urls: collections.Counter[bool] = collections.Counter()
+        self.reconciled_at: datetime.datetime | None = None
+        # The changes applied since the running reconcile started counting
+        self._applied_while_reconciling: list[StatsDelta] | None = None
+        # Transactions that started committing before that, without a transaction ID
+        self._untracked_commits = 0
+        self._untracked_committed = asyncio.Event()
+
+    def changes(self, session: sqlalchemy.ext.asyncio.AsyncSession) -> StatsDelta:
+        """The changes of the session's transaction, counted once it commits."""
+        delta = session.info.get("stats_delta")
+        if delta is None:
+            delta = session.info["stats_delta"] = StatsDelta()
+            untracked = False
+
+            def before_commit(sync_session: sqlalchemy.orm.Session):
+                nonlocal untracked
+                if self._applied_while_reconciling is None:
+                    untracked = True
+                    self._untracked_commits += 1
+                elif sync_session.bind.dialect.name == "postgresql":
+                    delta.transaction_id = int(
+                        sync_session.scalar(
+                            select(
+                                sqlalchemy.cast(
+                                    sqlalchemy.func.pg_current_xact_id(),
+                                    sqlalchemy.Text,
+                                )
+                            )
+                        )
+                    )
+
+            def finished(event: str):
+                # The listener of this event only runs once, the others are removed
+                for identifier, listener in listeners.items():
+                    if identifier != event and sqlalchemy.event.contains(
+                        session.sync_session, identifier, listener
+                    ):
+                        sqlalchemy.event.remove(
+                            session.sync_session, identifier, listener
+                        )
+                if event == "after_commit":
+                    self.apply(session.info.pop("stats_delta"))
+                else:
+                    session.info.pop("stats_delta", None)
+                if untracked:
+                    self._untracked_commits -= 1
+                    if not self._untracked_commits:
+                        self._untracked_committed.set()
+
+            listeners = {
+                "before_commit": before_commit,
+                "after_commit": lambda _: finished("after_commit"),
+                "after_rollback": lambda _: finished("after_rollback"),
+            }
+            sqlalchemy.event.listen(
+                session.sync_session, "before_commit", before_commit
+            )
+            for identifier in ("after_commit", "after_rollback"):
+                sqlalchemy.event.listen(
+                    session.sync_session, identifier, listeners[identifier], once=True
+                )
+        return delta
+
+    def apply(self, delta: StatsDelta):
+        if self._applied_while_reconciling is not None:
+            self._applied_while_reconciling.append(delta)
+        self.jobs.update(delta.jobs)
+        self.batches += delta.batches
+        self.urls += delta.urls
+        self.archived_urls += delta.archived_urls
+        self.archive_times.update(delta.archive_times)
+        self.repeat_urls.update(delta.repeat_urls)
+        self._prune()
+
+    def _prune(self):
+        oldest = datetime.datetime.now(tz=datetime.timezone.utc) - self.recent_window
+        for timestamp in [
+            timestamp
+            for timestamp, count in self.archive_times.items()
+            if timestamp <= oldest or not count
+        ]:
+            del self.archive_times[timestamp]
+
+    def job_counts(self, state: JobState) -> dict[int, int]:
+        """Jobs in a state by retry."""
+        return {
+            retry: count
+            for (counted_state, retry), count in self.jobs.items()
+            if counted_state == state
+        }
+
+    def archived_since(self, since: datetime.datetime) -> int:
+        """URLs last archived after ``since``, which must be within the recent window."""
+        return sum(
+            count
+            for timestamp, count in self.archive_times.items()
+            if timestamp > since
+        )
+
+    async def reconcile(self, session: sqlalchemy.ext.asyncio.AsyncSession):
+        """Count everything in the database again.
+
+        Must be the first thing the session's transaction does.
+        """
+        applied = self._applied_while_reconciling = []
+        try:
+            # Changes from transactions that started committing before the lookup of
+            # transaction IDs are all in the snapshot
+            while self._untracked_commits:
+                self._untracked_committed.clear()
+                await self._untracked_committed.wait()
+            snapshot = None
+            if session.bind.dialect.name == "sqlite":
+                # One read transaction for every count, which holds the write lock so
+                # that nothing is committed before the counts are replaced
+                await session.execute(sqlalchemy.text("BEGIN IMMEDIATE"))
+            else:
+                await session.connection(
+                    execution_options={"isolation_level": "REPEATABLE READ"}
+                )
+                snapshot = await session.scalar(
+                    select(
+                        sqlalchemy.cast(
+                            sqlalchemy.func.pg_current_snapshot(), sqlalchemy.Text
+                        )
+                    )
+                )
+            counts = await self._count(session)
+        finally:
+            self._applied_while_reconciling = None
+        (
+            self.jobs,
+            self.batches,
+            self.urls,
+            self.archived_urls,
+            self.archive_times,
+            self.repeat_urls,
+            self.reconciled_at,
+        ) = counts
+        for delta in applied:
+            if not _in_snapshot(delta.transaction_id, snapshot):
+                self.apply(delta)
+        self._prune()
+
+    async def _count(self, session: sqlalchemy.ext.asyncio.AsyncSession):
+        curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+        state = sqlalchemy.case(
+            (Job.completed != None, "completed"),
+            (Job.failed != None, "failed"),
+            else_="pending",
+        )
+        result = await session.execute(
+            select(state, Job.retry, sqlalchemy.func.count()).group_by(state, Job.retry)
+        )
+        jobs = collections.Counter(
+            {(state, retry): count for state, retry, count in result.tuples().all()}
+        )
+        batches = await session.scalar(select(sqlalchemy.func.count(Batch.id)))
+        urls, archived_urls = (
+            await session.execute(
+                select(
+                    sqlalchemy.func.count(URL.id), sqlalchemy.func.count(URL.last_seen)
+                )
+            )
+        ).one()
+        if session.bind.dialect.name == "sqlite":
+            second = sqlalchemy.func.strftime("%Y-%m-%d %H:%M:%S", URL.last_seen)
+        else:
+            second = sqlalchemy.func.date_trunc("second", URL.last_seen)
+        # Only reads the recent end of the index on last_seen
+        result = await session.execute(
+            select(second, sqlalchemy.func.count())
+            .where(URL.last_seen > curtime - self.recent_window)
+            .group_by(second)
+        )
+        archive_times = collections.Counter(
+            {
+                _to_second(
+                    datetime.datetime.fromisoformat(timestamp)
+                    if isinstance(timestamp, str)
+                    else timestamp
+                ): count
+                for timestamp, count in result.tuples().all()
+            }
+        )
+        active = RepeatURL.active_since != None
+        result = await session.execute(
+            select(active, sqlalchemy.func.count()).group_by(active)
+        )
+        repeat_urls = collections.Counter(dict(result.tuples().all()))
+        return (
+            jobs,
+            batches,
+            urls,
+            archived_urls,
+            archive_times,
+            repeat_urls,
+            curtime,
+        )
+
+    async def run(self):
+        from .main import async_session
+
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                async with async_session() as session, session.begin():
+                    await self.reconcile(session)
+            except Exception:
+                print("Failed to reconcile the stats counters, retrying later:")
+                print_exc()
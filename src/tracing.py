@@ -0,0 +1,160 @@
+import datetime
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+# Routes that are polled or scraped constantly are only worth tracing when slow (see
+# TracesSampler), and ingestion is rare enough to trace more often. Overridden by
+# SENTRY_TRACES_SAMPLE_RATES.
+default_traces_sample_rates: dict[str, float] = {
+    "/metrics": 0,
+    "/job/current": 0,
+    "/app": 0,
+    "/stats": 0.01,
+    "/job/grid_sort": 0.01,
+    "/queue": 0.5,
+    "/batch/create": 0.5,
+}
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """Parse ``key=rate`` pairs separated by commas, e.g. ``/job=0.1,http.server=0.05``."""
+    rates = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        key, _, rate = pair.partition("=")
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for {key} must be between 0 and 1")
+        rates[key.strip()] = rate
+    return rates
+
+
+def trace_fraction(trace_id: str | None) -> float:
+    """A number in [0, 1) derived from the trace ID, the same whenever it is computed."""
+    if not trace_id:
+        return 0
+    return int(trace_id[:8], 16) / 0x100000000
+
+
+def _as_datetime(value: datetime.datetime | str) -> datetime.datetime:
+    # Events are serialized before they reach before_send_transaction
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class TracesSampler:
+    """Per-route and per-operation sampling for Sentry transactions.
+
+    ``rates`` maps route prefixes (starting with ``/``, the longest matching prefix
+    wins) and operations (such as ``http.server``) to the share of transactions to
+    keep. Everything else is kept at ``default_rate``. On top of that, at most
+    ``max_per_minute`` transactions are kept per rule, so that a burst of traffic on
+    one route does not send a burst of traces.
+
+    A further ``slow_capture_rate`` of transactions is recorded (but not profiled)
+    only to see whether it turns out slow: :meth:`before_send_transaction` sends
+    those that took at least ``slow_transaction_seconds`` and drops the rest. This
+    applies to routes with a rate of 0 too, so slow requests to them still show up.
+    Whether to record a transaction is decided before it runs, so only slow
+    transactions within ``rate + slow_capture_rate`` of the traffic are ever seen.
+    Both decisions are derived from the trace ID, so they agree with each other.
+    Errors are not affected by any of this.
+    """
+
+    def __init__(
+        self,
+        *,
+        default_rate: float,
+        rates: dict[str, float],
+        profiles_rate: float,
+        slow_capture_rate: float,
+        slow_transaction_seconds: float,
+        max_per_minute: int,
+    ):
+        self.default_rate = default_rate
+        self.route_rates = sorted(
+            ((key, rate) for key, rate in rates.items() if key.startswith("/")),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.op_rates = {
+            key: rate for key, rate in rates.items() if not key.startswith("/")
+        }
+        self.profiles_rate = profiles_rate
+        self.slow_capture_rate = slow_capture_rate
+        self.slow_transaction_seconds = slow_transaction_seconds
+        self.max_per_minute = max_per_minute
+        # Rule -> (start of the current minute, transactions kept in it)
+        self._kept: dict[str, tuple[float, int]] = {}
+
+    def rule(self, op: str | None, path: str | None) -> tuple[str, float]:
+        """The rule that applies to a transaction, and its sample rate."""
+        if path is not None:
+            for prefix, rate in self.route_rates:
+                if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                    return prefix, rate
+        if op in self.op_rates:
+            return op, self.op_rates[op]
+        return "default", self.default_rate
+
+    def _within_budget(self, rule: str) -> bool:
+        now = time.monotonic()
+        start, kept = self._kept.get(rule, (now, 0))
+        if now - start >= 60:
+            start, kept = now, 0
+        if kept >= self.max_per_minute:
+            return False
+        self._kept[rule] = (start, kept + 1)
+        return True
+
+    @staticmethod
+    def _sampling_context_path(sampling_context: dict[str, Any]) -> str | None:
+        if asgi_scope := sampling_context.get("asgi_scope"):
+            return asgi_scope.get("path")
+        return sampling_context["transaction_context"].get("name")
+
+    def traces_sampler(self, sampling_context: dict[str, Any]) -> float:
+        if sampling_context.get("parent_sampled") is not None:
+            return float(sampling_context["parent_sampled"])
+        transaction_context = sampling_context["transaction_context"]
+        rule, rate = self.rule(
+            transaction_context.get("op"),
+            self._sampling_context_path(sampling_context),
+        )
+        fraction = trace_fraction(transaction_context.get("trace_id"))
+        if fraction < rate:
+            return 1 if self._within_budget(rule) else 0
+        return 1 if fraction < rate + self.slow_capture_rate else 0
+
+    def profiles_sampler(self, sampling_context: dict[str, Any]) -> float:
+        """Only profile transactions that are kept regardless of their duration."""
+        transaction_context = sampling_context["transaction_context"]
+        _, rate = self.rule(
+            transaction_context.get("op"),
+            self._sampling_context_path(sampling_context),
+        )
+        if trace_fraction(transaction_context.get("trace_id")) < rate:
+            return self.profiles_rate
+        return 0
+
+    def before_send_transaction(self, event: dict[str, Any], hint: dict[str, Any]):
+        trace = event.get("contexts", {}).get("trace", {})
+        if trace.get("parent_span_id"):
+            # Sampled by the caller (see traces_sampler)
+            return event
+        url = event.get("request", {}).get("url")
+        _, rate = self.rule(
+            trace.get("op"), urlsplit(url).path if url else event.get("transaction")
+        )
+        if trace_fraction(trace.get("trace_id")) < rate:
+            return event
+        # Only recorded in case it turned out slow
+        try:
+            duration = (
+                _as_datetime(event["timestamp"])
+                - _as_datetime(event["start_timestamp"])
+            ).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            return event
+        return event if duration >= self.slow_transaction_seconds else None
@@ -0,0 +1,200 @@
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from aiohttp import (
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+    TraceConfig,
+    TraceConnectionCreateEndParams,
+    TraceConnectionCreateStartParams,
+    TraceConnectionReuseconnParams,
+    TraceDnsResolveHostEndParams,
+    TraceDnsResolveHostStartParams,
+    TraceRequestEndParams,
+    TraceRequestExceptionParams,
+    TraceRequestStartParams,
+)
+from aiohttp.client import _RequestContextManager
+from pydantic import BaseModel
+
+from . import metrics
+
+
+class RequestTimings(BaseModel):
+    """Where the time of one request went, in seconds. Unset phases did not happen."""
+
+    dns: float | None = None
+    connect: float | None = None
+    # Until the response headers arrived, counted from the start of the request
+    ttfb: float | None = None
+    reused_connection: bool = False
+
+
+class TransportState(BaseModel):
+    connection_limit: int
+    requests: int
+    new_connections: int
+    reused_connections: int
+    dns_lookups: int
+    dns_cache_hits: int
+    avg_dns_ms: float | None
+    avg_connect_ms: float | None
+    avg_ttfb_ms: float | None
+    recent: list[RequestTimings]
+
+
+class ArchiveTransport:
+    """The HTTP client used for archive requests.
+
+    Wraps a :class:`ClientSession` with timeouts, a connection pool sized to the
+    number of workers, a DNS cache and an optional proxy. Trace hooks record the DNS,
+    connect and time-to-first-byte timings of every request. :meth:`open` and
+    :meth:`close` are called by the app's lifespan.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int,
+        connect_timeout: float,
+        read_timeout: float,
+        total_timeout: float | None,
+        dns_cache_ttl: int,
+        keepalive_timeout: float,
+        proxy: str | None = None,
+        recent_requests: int = 20,
+    ):
+        self.max_connections = max_connections
+        self.timeout = ClientTimeout(
+            total=total_timeout, connect=connect_timeout, sock_read=read_timeout
+        )
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.proxy = proxy
+        self.session: ClientSession | None = None
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_lookups = 0
+        self.dns_cache_hits = 0
+        self._dns_total = 0.0
+        self._connect_total = 0.0
+        self._ttfb_total = 0.0
+        self._ttfb_count = 0
+        self.recent: deque[RequestTimings] = deque(maxlen=recent_requests)
+
+    async def open(self):
+        connector = TCPConnector(
+            limit=self.max_connections,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get(self, url: str, **kwargs) -> _RequestContextManager:
+        if self.session is None:
+            raise RuntimeError("The transport is not open")
+        timings = RequestTimings()
+        self.recent.append(timings)
+        return self.session.get(
+            url, proxy=self.proxy, trace_request_ctx=timings, **kwargs
+        )
+
+    def _trace_config(self) -> TraceConfig:
+        trace_config = TraceConfig()
+
+        async def on_request_start(
+            _, ctx: SimpleNamespace, params: TraceRequestStartParams
+        ):
+            ctx.request_start = time.monotonic()
+            self.requests += 1
+
+        async def on_dns_resolvehost_start(
+            _, ctx: SimpleNamespace, params: TraceDnsResolveHostStartParams
+        ):
+            ctx.dns_start = time.monotonic()
+
+        async def on_dns_resolvehost_end(
+            _, ctx: SimpleNamespace, params: TraceDnsResolveHostEndParams
+        ):
+            ctx.trace_request_ctx.dns = time.monotonic() - ctx.dns_start
+            self.dns_lookups += 1
+            self._dns_total += ctx.trace_request_ctx.dns
+
+        async def on_dns_cache_hit(_, ctx: SimpleNamespace, params):
+            self.dns_cache_hits += 1
+
+        async def on_connection_create_start(
+            _, ctx: SimpleNamespace, params: TraceConnectionCreateStartParams
+        ):
+            ctx.connect_start = time.monotonic()
+
+        async def on_connection_create_end(
+            _, ctx: SimpleNamespace, params: TraceConnectionCreateEndParams
+        ):
+            # Includes the DNS lookup, if there was one
+            ctx.trace_request_ctx.connect = time.monotonic() - ctx.connect_start
+            self.new_connections += 1
+            self._connect_total += ctx.trace_request_ctx.connect
+
+        async def on_connection_reuseconn(
+            _, ctx: SimpleNamespace, params: TraceConnectionReuseconnParams
+        ):
+            ctx.trace_request_ctx.reused_connection = True
+            self.reused_connections += 1
+
+        async def on_request_end(
+            _, ctx: SimpleNamespace, params: TraceRequestEndParams
+        ):
+            ctx.trace_request_ctx.ttfb = time.monotonic() - ctx.request_start
+            self._ttfb_count += 1
+            self._ttfb_total += ctx.trace_request_ctx.ttfb
+            metrics.archive_request_seconds.observe(
+                ctx.trace_request_ctx.ttfb, status=str(params.response.status)
+            )
+
+        async def on_request_exception(
+            _, ctx: SimpleNamespace, params: TraceRequestExceptionParams
+        ):
+            metrics.archive_request_seconds.observe(
+                time.monotonic() - ctx.request_start, status="error"
+            )
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def state(self) -> TransportState:
+        def average_ms(total: float, count: int) -> float | None:
+            return total / count * 1000 if count else None
+
+        return TransportState(
+            connection_limit=self.max_connections,
+            requests=self.requests,
+            new_connections=self.new_connections,
+            reused_connections=self.reused_connections,
+            dns_lookups=self.dns_lookups,
+            dns_cache_hits=self.dns_cache_hits,
+            avg_dns_ms=average_ms(self._dns_total, self.dns_lookups),
+            avg_connect_ms=average_ms(self._connect_total, self.new_connections),
+            avg_ttfb_ms=average_ms(self._ttfb_total, self._ttfb_count),
+            recent=list(self.recent),
+        )
@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import time
+from traceback import print_exc
+from typing import Iterable
+
+from sqlalchemy import bindparam, select, update
+import sqlalchemy.ext.asyncio
+
+from . import metrics
+from .models import URL, Job
+from .stats_counters import job_state
+
+# Every column an archive attempt can change. Buffered rows always carry all of them,
+# so that each flush is a single executemany per table.
+job_state_columns = (
+    "completed",
+    "failed",
+    "delayed_until",
+    "attempts",
+    "retry",
+    "claimed_by",
+    "lease_expires",
+)
+# Writes the buffered state of a job, unless its lease was taken over by another worker
+leased_job_update = (
+    update(Job.__table__)
+    .where(
+        (Job.__table__.c.id == bindparam("job_id"))
+        & (Job.__table__.c.claimed_by == bindparam("lease_owner"))
+    )
+    .values({column: bindparam(column) for column in job_state_columns})
+)
+
+
+async def complete_sibling_jobs(
+    session: sqlalchemy.ext.asyncio.AsyncSession,
+    url_ids: Iterable[int],
+    curtime: datetime.datetime,
+) -> int:
+    """Complete the pending jobs of just captured URLs with the new snapshot, in one statement.
+
+    Only jobs queued before the snapshot was taken are completed, and jobs leased by
+    another worker are left to it.
+
+    :return: The number of completed jobs
+    """
+    from .main import stats_counters
+
+    # Snapshot timestamps are truncated to the second
+    if session.bind.dialect.name == "sqlite":
+        # SQLite stores timestamps as text
+        captured_before = sqlalchemy.func.datetime(URL.last_seen, "+1 seconds")
+    else:
+        captured_before = URL.last_seen + datetime.timedelta(seconds=1)
+    result = await session.execute(
+        update(Job)
+        .where(
+            (Job.url_id == URL.id)
+            & URL.id.in_(list(url_ids))
+            & (Job.completed == None)
+            & (Job.failed == None)
+            & (Job.created_at < captured_before)
+            & ((Job.lease_expires == None) | (Job.lease_expires < curtime))
+        )
+        .values(
+            completed=URL.last_seen,
+            delayed_until=None,
+            claimed_by=None,
+            lease_expires=None,
+        )
+        .returning(Job.retry)
+        .execution_options(synchronize_session=False)
+    )
+    retries = result.scalars().all()
+    changes = stats_counters.changes(session)
+    for retry in retries:
+        changes.job_moved(("pending", retry), ("completed", retry))
+    if retries:
+        print(f"Completed {len(retries)} duplicate jobs for captured URLs.")
+    return len(retries)
+
+
+class JobUpdateBuffer:
+    """Collects the outcome of archive attempts and writes them in bulk.
+
+    Workers record updates with :meth:`update_job` and :meth:`update_url`. :meth:`run`
+    flushes them in one transaction (one bulk ``UPDATE`` for ``urls`` and one for
+    ``jobs``) once ``max_size`` jobs are pending or ``max_delay`` seconds after the
+    first pending update, whichever comes first. Other pending jobs for a captured URL
+    that were queued before the capture are completed along with it, since archiving
+    them again would only produce the same snapshot.
+
+    Durability: an update is only durable once its flush commits. Until then the job
+    stays leased to this process, both in the database and in ``claimed_jobs`` (so
+    other jobs for the same URL are not claimed either). If the process dies before
+    flushing, the lease expires and the job is archived again, so every job is
+    archived at least once and a crash loses at most the last ``max_delay`` seconds of
+    results. A failed flush is retried with the next one. If a lease expires before
+    its flush and another worker claims the job in the meantime, this process's
+    result for it is dropped instead of overwriting that worker's.
+    """
+
+    def __init__(self, max_size: int, max_delay: float):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._jobs: dict[int, dict] = {}
+        # The retry of each pending job when it was claimed, for the stats counters
+        self._claimed_retries: dict[int, int] = {}
+        self._urls: dict[int, datetime.datetime] = {}
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def update_job(self, job: Job, **values):
+        """Queue new values for a job's state columns, the rest keep their current values."""
+        row = self._jobs.get(job.id)
+        if row is None:
+            row = {"id": job.id}
+            row.update((column, getattr(job, column)) for column in job_state_columns)
+            self._jobs[job.id] = row
+            self._claimed_retries[job.id] = job.retry
+        row.update(values)
+        self._pending.set()
+        if len(self._jobs) >= self.max_size:
+            self._full.set()
+
+    def update_url(self, url_id: int, last_seen: datetime.datetime):
+        """Queue a new URL.last_seen, keeping the latest one if the URL is already queued."""
+        if url_id not in self._urls or self._urls[url_id] < last_seen:
+            self._urls[url_id] = last_seen
+        self._pending.set()
+
+    async def flush(self):
+        """Write every pending update, and release the flushed jobs from this process."""
+        from .main import (
+            async_session,
+            claimed_jobs,
+            jobs_queued,
+            stats_counters,
+            worker_id,
+        )
+
+        curtime = datetime.datetime.now(tz=datetime.timezone.utc)
+
+        async with self._lock:
+            if not self._jobs and not self._urls:
+                return
+            jobs, self._jobs = self._jobs, {}
+            claimed_retries, self._claimed_retries = self._claimed_retries, {}
+            urls, self._urls = self._urls, {}
+            self._pending.clear()
+            self._full.clear()
+            start = time.perf_counter()
+            duplicates = 0
+            lost = 0
+            try:
+                async with async_session() as session, session.begin():
+                    changes = stats_counters.changes(session)
+                    if urls:
+                        result = await session.execute(
+                            select(URL.id, URL.last_seen).where(URL.id.in_(list(urls)))
+                        )
+                        for url_id, last_seen in result.tuples().all():
+                            changes.url_archived(last_seen, urls[url_id])
+                        await session.execute(
+                            update(URL),
+                            [
+                                {"id": url_id, "last_seen": last_seen}
+                                for url_id, last_seen in urls.items()
+                            ],
+                        )
+                    if jobs:
+                        # A job whose lease expired before this flush may have been
+                        # claimed by another worker since, whose outcome wins
+                        result = await session.execute(
+                            select(Job.id)
+                            .where(
+                                Job.id.in_(list(jobs)) & (Job.claimed_by == worker_id)
+                            )
+                            .with_for_update()
+                        )
+                        leased = set(result.scalars().all())
+                        lost = len(jobs) - len(leased)
+                        if leased:
+                            await session.execute(
+                                leased_job_update,
+                                [
+                                    {
+                                        "job_id": job_id,
+                                        "lease_owner": worker_id,
+                                        **{
+                                            column: row[column]
+                                            for column in job_state_columns
+                                        },
+                                    }
+                                    for job_id, row in jobs.items()
+                                    if job_id in leased
+                                ],
+                            )
+                        for job_id, row in jobs.items():
+                            if job_id not in leased:
+                                continue
+                            changes.job_moved(
+                                ("pending", claimed_retries[job_id]),
+                                (
+                                    job_state(row["completed"], row["failed"]),
+                                    row["retry"],
+                                ),
+                            )
+                    if urls:
+                        duplicates = await complete_sibling_jobs(
+                            session, urls.keys(), curtime
+                        )
+            except BaseException:
+                # Put the updates back, without overwriting anything queued since
+                for job_id, row in jobs.items():
+                    self._jobs.setdefault(job_id, row)
+                    self._claimed_retries.setdefault(job_id, claimed_retries[job_id])
+                for url_id, last_seen in urls.items():
+                    self.update_url(url_id, last_seen)
+                self._pending.set()
+                raise
+            metrics.write_buffer_flush_seconds.observe(time.perf_counter() - start)
+        if lost:
+            print(
+                f"Dropped the results of {lost} jobs whose lease was taken over by "
+                "another worker."
+            )
+            metrics.lost_job_leases_total.inc(lost)
+        for job_id in jobs:
+            claimed_jobs.pop(job_id, None)
+        metrics.duplicate_jobs_completed_total.inc(duplicates)
+        # Let an idle dispatcher know about new delayed_until values and unblocked URLs
+        jobs_queued.set()
+
+    async def run(self):
+        while True:
+            await self._pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                print("Failed to write buffered job updates, retrying:")
+                print_exc()
+                await asyncio.sleep(self.max_delay)
@@ -0,0 +1,59 @@
+import datetime
+import unittest
+
+from src.tracing import TracesSampler
+
+# trace_fraction() of these is 0.0625 and 0.9375
+IN_SLOW_BAND = "10000000000000000000000000000000"
+OUTSIDE = "f0000000000000000000000000000000"
+
+
+def sampler() -> TracesSampler:
+    return TracesSampler(
+        default_rate=0.1,
+        rates={"/job/current": 0},
+        profiles_rate=1,
+        slow_capture_rate=0.25,
+        slow_transaction_seconds=2,
+        max_per_minute=60,
+    )
+
+
+def sampling_context(trace_id: str, path: str) -> dict:
+    return {
+        "parent_sampled": None,
+        "transaction_context": {"op": "http.server", "trace_id": trace_id},
+        "asgi_scope": {"path": path},
+    }
+
+
+def transaction(trace_id: str, path: str, seconds: float) -> dict:
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    return {
+        "contexts": {"trace": {"op": "http.server", "trace_id": trace_id}},
+        "request": {"url": f"http://localhost:8000{path}"},
+        "start_timestamp": start.isoformat(),
+        "timestamp": (start + datetime.timedelta(seconds=seconds)).isoformat(),
+    }
+
+
+class SlowTransactionsOnUnsampledRoutes(unittest.TestCase):
+    def test_slow_transaction_is_kept(self):
+        traces = sampler()
+        context = sampling_context(IN_SLOW_BAND, "/job/current")
+        self.assertEqual(traces.traces_sampler(context), 1)
+        self.assertEqual(traces.profiles_sampler(context), 0)
+        event = transaction(IN_SLOW_BAND, "/job/current", 3)
+        self.assertIs(traces.before_send_transaction(event, {}), event)
+
+    def test_fast_transaction_is_dropped(self):
+        event = transaction(IN_SLOW_BAND, "/job/current", 0.5)
+        self.assertIsNone(sampler().before_send_transaction(event, {}))
+
+    def test_outside_the_slow_band_is_not_recorded(self):
+        context = sampling_context(OUTSIDE, "/job/current")
+        self.assertEqual(sampler().traces_sampler(context), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()